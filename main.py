@@ -4,27 +4,160 @@ Zerodha GTT Stop-Loss Strategy Automation
 Automated Good Till Triggered (GTT) stop-loss strategy using Kite Connect API
 """
 
+import atexit
+import functools
+import io
 import json
 import logging
 import os
+import queue
+import stat
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
 from kiteconnect import KiteConnect
 import config
 
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib json module
+    orjson = None
+
 # Configure logging
+# File output is rotated and written by a background listener thread, so
+# logging calls only enqueue records; the queue is drained at interpreter exit
+log_file_handler = RotatingFileHandler('gtt_strategy.log', maxBytes=10 * 1024 * 1024, backupCount=3)
+log_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+log_queue = queue.SimpleQueue()
+log_queue_listener = QueueListener(log_queue, log_file_handler)
+log_queue_listener.start()
+atexit.register(log_queue_listener.stop)
+
+# QueueHandler.prepare() bakes the formatted text into the record before it is
+# queued, so it must pass the bare message through for the file handler to format
+log_queue_handler = QueueHandler(log_queue)
+log_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('gtt_strategy.log'),
+        log_queue_handler,
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
-def round_to_tick(price, tick_size=0.05):
+# Kite Connect allows up to 10 API requests per second
+KITE_API_RATE_LIMIT = 10
+
+# Number of symbols whose GTT updates are executed concurrently in a live run
+MAX_EXECUTION_WORKERS = 8
+
+class RateLimiter:
+    """
+    Thread-safe limiter spacing API requests at least 1/rate seconds apart
+    
+    Callers are released one at a time, each at least 1/rate seconds after the
+    previous one, so there is no initial burst and no one-second window ever
+    sees more than rate requests.
+    """
+    
+    def __init__(self, rate):
+        """
+        Args:
+            rate (float): Maximum number of requests in any one-second window
+        """
+        self.interval = 1 / rate
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """
+        Block until a request may be sent
+        """
+        # Sleeping under the lock spaces releases by when they actually happen,
+        # so a late wake-up cannot bunch up with the requests queued behind it
+        with self.lock:
+            wait_time = self.next_slot - time.monotonic()
+            if wait_time > 0:
+                time.sleep(wait_time)
+            self.next_slot = time.monotonic() + self.interval
+
+api_rate_limiter = RateLimiter(KITE_API_RATE_LIMIT)
+
+@dataclass(slots=True, frozen=True)
+class Holding:
+    """
+    Equity holding with its last traded price, as consumed by plan_gtt_updates
+    """
+    tradingsymbol: str
+    quantity: int
+    last_price: float
+    exchange: str = 'NSE'
+
+@dataclass(slots=True, frozen=True)
+class Tier:
+    """
+    Quantity and prices for a single stop-loss GTT tier
+    """
+    qty: int
+    trigger: float
+    limit: float
+
+@dataclass(slots=True, frozen=True)
+class Plan:
+    """
+    GTT plan for a single holding
+    
+    UPDATE plans carry new_high and both tiers. NO_ACTION plans keep the
+    prices they were compared on, the reason text is only built when read.
+    """
+    symbol: str
+    action: str
+    exchange: str = 'NSE'
+    new_high: float = 0.0
+    tier1: Optional[Tier] = None
+    tier2: Optional[Tier] = None
+    current_price: float = 0.0
+    last_high_price: float = 0.0
+    
+    @property
+    def reason(self):
+        """
+        Explanation for a NO_ACTION plan, empty for other actions
+        """
+        if self.action != 'NO_ACTION':
+            return ''
+        return f"LTP ({self.current_price}) not a new high ({self.last_high_price})"
+
+# Strategy parameters in the form plan_gtt_updates uses them: price multipliers
+# (1 - pct) for each tier's trigger and limit, and the Tier 1 quantity share
+TierParams = namedtuple('TierParams', [
+    'tier1_trigger_mult', 'tier1_limit_mult',
+    'tier2_trigger_mult', 'tier2_limit_mult',
+    'tier1_qty_pct'
+])
+
+# Default NSE/BSE equity tick size, in rupees and in paise
+DEFAULT_TICK_SIZE = 0.05
+DEFAULT_TICK_PAISE = 5
+
+def round_to_tick(price, tick_size=DEFAULT_TICK_SIZE):
     """
     Round a price down to the nearest valid tick size
     
+    Tick sizes that are a whole number of paise are rounded in integer
+    paise, so the result is an exact two-decimal price rather than a float
+    multiple of tick_size. Finer ticks (e.g. 0.0025 for currency
+    derivatives) fall back to Decimal arithmetic on the decimal values.
+    
     Args:
         price (float): Price to round
         tick_size (float): Tick size (default 0.05 for 5 paise)
@@ -32,13 +165,28 @@ def round_to_tick(price, tick_size=0.05):
     Returns:
         float: Price rounded down to nearest valid tick
         
+    Raises:
+        ValueError: If tick_size is not positive
+        
     Examples:
         round_to_tick(10.18) -> 10.15
         round_to_tick(10.14) -> 10.10
         round_to_tick(10.15) -> 10.15
+        round_to_tick(10.1234, 0.0025) -> 10.1225
     """
-    import math
-    return math.floor(price / tick_size) * tick_size
+    if tick_size == DEFAULT_TICK_SIZE:
+        tick_paise = DEFAULT_TICK_PAISE
+    else:
+        if tick_size <= 0:
+            raise ValueError(f"tick_size must be positive, got {tick_size}")
+        tick_paise = round(tick_size * 100)
+        if tick_paise == 0 or abs(tick_size * 100 - tick_paise) > 1e-6:
+            # Not a whole number of paise: work on the decimal values instead
+            tick = Decimal(str(tick_size))
+            return float((Decimal(str(price)) // tick) * tick)
+    # The epsilon absorbs float representation error, e.g. 10.20 * 100 == 1019.9999999999999
+    price_paise = int(price * 100 + 1e-6)
+    return (price_paise // tick_paise) * tick_paise / 100
 
 def load_gtt_state(filepath):
     """
@@ -51,29 +199,31 @@ def load_gtt_state(filepath):
         dict: Loaded state data or empty dictionary if file doesn't exist or is invalid
     """
     try:
-        if not os.path.exists(filepath):
-            logger.info(f"State file {filepath} does not exist, returning empty state")
+        # A missing file surfaces as FileNotFoundError from open()
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        
+        if not content.strip():
+            logger.info("State file %s is empty, returning empty state", filepath)
             return {}
         
-        with open(filepath, 'r') as f:
-            content = f.read().strip()
-            if not content:
-                logger.info(f"State file {filepath} is empty, returning empty state")
-                return {}
-            
+        if orjson is not None:
+            state_data = orjson.loads(content)
+        else:
             state_data = json.loads(content)
-            logger.info(f"Successfully loaded state from {filepath}")
-            return state_data
+        
+        logger.info("Successfully loaded state from %s", filepath)
+        return state_data
             
     except FileNotFoundError:
-        logger.info(f"State file {filepath} not found, returning empty state")
+        logger.info("State file %s does not exist, returning empty state", filepath)
         return {}
     except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON in state file {filepath}: {e}")
+        logger.error("Invalid JSON in state file %s: %s", filepath, e)
         logger.info("Returning empty state due to JSON decode error")
         return {}
     except Exception as e:
-        logger.error(f"Error loading state from {filepath}: {e}")
+        logger.error("Error loading state from %s: %s", filepath, e)
         logger.info("Returning empty state due to unexpected error")
         return {}
 
@@ -81,6 +231,13 @@ def save_gtt_state(filepath, state_data):
     """
     Save GTT state to JSON file
     
+    The state is written to a temporary file in the same directory, fsynced
+    and then renamed over the target, so a crash mid-write never leaves a
+    truncated state file behind. The temporary file takes the permissions of
+    the existing state file (or the umask default for a new one), and the
+    directory is fsynced after the rename so the rename itself is durable;
+    if only that directory fsync fails, the save still counts as successful.
+    
     Args:
         filepath (str): Path to the JSON state file
         state_data (dict): State data to save
@@ -89,99 +246,179 @@ def save_gtt_state(filepath, state_data):
         bool: True if successful, False otherwise
     """
     try:
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        directory = os.path.dirname(filepath)
         
-        with open(filepath, 'w') as f:
-            json.dump(state_data, f, indent=2)
+        # Create directory if it doesn't exist (bare filenames live in the current directory)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
         
-        logger.info(f"Successfully saved state to {filepath}")
+        if orjson is not None:
+            payload = orjson.dumps(state_data, option=orjson.OPT_INDENT_2)
+        else:
+            payload = json.dumps(state_data, indent=2).encode('utf-8')
+        
+        # Created with 0o666 so the kernel applies the umask, as a plain open() would
+        temp_path = os.path.join(
+            directory or '.',
+            f"{os.path.basename(filepath)}.{uuid.uuid4().hex}.tmp"
+        )
+        fd = os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            
+            # Keep the permissions of the state file being replaced
+            try:
+                os.chmod(temp_path, stat.S_IMODE(os.stat(filepath).st_mode))
+            except FileNotFoundError:
+                pass
+            
+            os.replace(temp_path, filepath)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        
+        # Persist the rename itself (directories cannot be opened for fsync on Windows);
+        # the new state is already in place, so a failure here is only a durability warning
+        if os.name != 'nt':
+            try:
+                dir_fd = os.open(directory or '.', os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            except OSError as e:
+                logger.warning("Saved state to %s but could not fsync its directory: %s", filepath, e)
+                return True
+        
+        logger.info("Successfully saved state to %s", filepath)
         return True
         
     except Exception as e:
-        logger.error(f"Error saving state to {filepath}: {e}")
+        logger.error("Error saving state to %s: %s", filepath, e)
         return False
 
+def get_tier_params(config):
+    """
+    Derive the tier multipliers from the strategy configuration
+    
+    Args:
+        config: Configuration object with strategy parameters
+        
+    Returns:
+        TierParams: Trigger/limit multipliers for both tiers and the Tier 1 quantity share
+    """
+    return TierParams(
+        tier1_trigger_mult=1 - config.TIER_1_TRIGGER_PCT,
+        tier1_limit_mult=1 - config.TIER_1_LIMIT_PCT,
+        tier2_trigger_mult=1 - config.TIER_2_TRIGGER_PCT,
+        tier2_limit_mult=1 - config.TIER_2_LIMIT_PCT,
+        tier1_qty_pct=config.TIER_1_QTY_PCT
+    )
+
 def plan_gtt_updates(portfolio, gtt_state, config):
     """
     Plan GTT updates based on portfolio holdings and current state
     
     Args:
-        portfolio (list): List of portfolio holdings with last_price
+        portfolio (list): List of Holding objects
         gtt_state (dict): Current GTT state with last_high_price for each symbol
         config: Configuration object with strategy parameters
         
     Returns:
-        list: List of plan dictionaries for each holding
+        list: List of Plan objects, one for each holding
     """
     plans = []
     
+    # Tier multipliers are the same for every holding, compute them once
+    (tier1_trigger_mult, tier1_limit_mult,
+     tier2_trigger_mult, tier2_limit_mult,
+     tier1_qty_pct) = get_tier_params(config)
+    
+    # Most holdings are NO_ACTION on a quiet day, only log them when DEBUG is on
+    log_no_action = logger.isEnabledFor(logging.DEBUG)
+    
     for holding in portfolio:
-        symbol = holding['tradingsymbol']
-        current_price = holding['last_price']
-        quantity = holding['quantity']
-        exchange = holding.get('exchange', 'NSE')  # Default to NSE if not specified
+        symbol = holding.tradingsymbol
+        current_price = holding.last_price
+        quantity = holding.quantity
+        exchange = holding.exchange
         
         # Get last high price from state, or use current price if new holding
-        last_high_price = gtt_state.get(symbol, {}).get('last_high_price', current_price)
+        symbol_state = gtt_state.get(symbol)
+        last_high_price = symbol_state.get('last_high_price', current_price) if symbol_state else current_price
         
         if current_price <= last_high_price:
             # No new high - no action needed
-            plan = {
-                'symbol': symbol,
-                'action': 'NO_ACTION',
-                'exchange': exchange,
-                'reason': f"LTP ({current_price}) not a new high ({last_high_price})"
-            }
-            plans.append(plan)
-            logger.debug(f"NO_ACTION for {symbol}: {plan['reason']}")
+            plans.append(Plan(
+                symbol=symbol,
+                action='NO_ACTION',
+                exchange=exchange,
+                current_price=current_price,
+                last_high_price=last_high_price
+            ))
+            if log_no_action:
+                logger.debug("NO_ACTION for %s: LTP (%s) not a new high (%s)", symbol, current_price, last_high_price)
             
         else:
             # New high detected - calculate new GTT levels
             new_high = current_price
             
             # Calculate trigger and limit prices for both tiers
-            tier1_trigger = new_high * (1 - config.TIER_1_TRIGGER_PCT)
-            tier1_limit = new_high * (1 - config.TIER_1_LIMIT_PCT)
-            tier2_trigger = new_high * (1 - config.TIER_2_TRIGGER_PCT)
-            tier2_limit = new_high * (1 - config.TIER_2_LIMIT_PCT)
+            tier1_trigger = new_high * tier1_trigger_mult
+            tier1_limit = new_high * tier1_limit_mult
+            tier2_trigger = new_high * tier2_trigger_mult
+            tier2_limit = new_high * tier2_limit_mult
             
             # Calculate quantities for each tier
-            tier1_qty = int(quantity * config.TIER_1_QTY_PCT)
+            tier1_qty = int(quantity * tier1_qty_pct)
             tier2_qty = quantity - tier1_qty
             
-            plan = {
-                'symbol': symbol,
-                'action': 'UPDATE',
-                'exchange': exchange,
-                'new_high': new_high,
-                'tier1': {
-                    'qty': tier1_qty,
-                    'trigger': round_to_tick(tier1_trigger),
-                    'limit': round_to_tick(tier1_limit)
-                },
-                'tier2': {
-                    'qty': tier2_qty,
-                    'trigger': round_to_tick(tier2_trigger),
-                    'limit': round_to_tick(tier2_limit)
-                }
-            }
+            plan = Plan(
+                symbol=symbol,
+                action='UPDATE',
+                exchange=exchange,
+                new_high=new_high,
+                tier1=Tier(
+                    qty=tier1_qty,
+                    trigger=round_to_tick(tier1_trigger),
+                    limit=round_to_tick(tier1_limit)
+                ),
+                tier2=Tier(
+                    qty=tier2_qty,
+                    trigger=round_to_tick(tier2_trigger),
+                    limit=round_to_tick(tier2_limit)
+                )
+            )
             plans.append(plan)
-            logger.info(f"UPDATE planned for {symbol}: new_high={new_high}, tier1_qty={tier1_qty}, tier2_qty={tier2_qty}")
+            logger.info("UPDATE planned for %s: new_high=%s, tier1_qty=%s, tier2_qty=%s", symbol, new_high, tier1_qty, tier2_qty)
     
-    logger.info(f"Generated {len(plans)} GTT plans")
+    logger.info("Generated %s GTT plans", len(plans))
     return plans
 
+@functools.lru_cache(maxsize=1)
 def get_kite_client():
     """
     Initialize and return a Kite Connect client
     
+    The client is created once and reused by later calls in the same process;
+    a failed initialization is not cached.
+    
     Returns:
         KiteConnect: Configured Kite Connect client instance
     """
     try:
-        # Initialize Kite Connect client
-        kite_client = KiteConnect(api_key=config.API_KEY)
+        # Initialize Kite Connect client; size its HTTPS connection pool so every
+        # execution worker can keep its own connection to the API alive
+        kite_client = KiteConnect(
+            api_key=config.API_KEY,
+            pool={
+                'pool_connections': MAX_EXECUTION_WORKERS,
+                'pool_maxsize': MAX_EXECUTION_WORKERS
+            }
+        )
         
         # Set access token
         kite_client.set_access_token(config.ACCESS_TOKEN)
@@ -190,68 +427,126 @@ def get_kite_client():
         return kite_client
         
     except Exception as e:
-        logger.error(f"Error initializing Kite Connect client: {e}")
+        logger.error("Error initializing Kite Connect client: %s", e)
         raise
 
+class MockKiteClient:
+    """
+    Minimal stand-in for KiteConnect used in dry run mode
+    
+    Holdings and LTPs come from the mock portfolio; GTT calls are only logged.
+    """
+    
+    def __init__(self):
+        self.name = "MockKiteClient"
+        self.next_trigger_id = 1
+    
+    def holdings(self):
+        """
+        Return the mock portfolio in the shape of KiteConnect.holdings()
+        
+        Returns:
+            list: Holding dicts with tradingsymbol, quantity, exchange and instrument_type
+        """
+        return [
+            {
+                'tradingsymbol': holding.tradingsymbol,
+                'quantity': holding.quantity,
+                'exchange': holding.exchange,
+                'instrument_type': 'EQ'
+            }
+            for holding in get_mock_portfolio_with_ltp()
+        ]
+    
+    def ltp(self, instruments):
+        """
+        Return the mock last traded prices in the shape of KiteConnect.ltp()
+        
+        Args:
+            instruments (list): Instrument keys in EXCHANGE:SYMBOL format
+            
+        Returns:
+            dict: Mapping of each known instrument key to a dict with its last_price
+        """
+        prices = {
+            f"{holding.exchange}:{holding.tradingsymbol}": holding.last_price
+            for holding in get_mock_portfolio_with_ltp()
+        }
+        return {
+            instrument: {'last_price': prices[instrument]}
+            for instrument in instruments if instrument in prices
+        }
+    
+    def get_gtts(self):
+        """
+        Return the active GTTs, of which a dry run never has any
+        
+        Returns:
+            list: Always empty
+        """
+        return []
+    
+    def place_gtt(self, **kwargs):
+        """
+        Log the GTT that would be placed and hand out the next trigger ID
+        
+        Args:
+            **kwargs: KiteConnect.place_gtt arguments; only tradingsymbol is used
+            
+        Returns:
+            dict: Response with the assigned trigger_id
+        """
+        trigger_id = self.next_trigger_id
+        self.next_trigger_id += 1
+        logger.info("[DRY RUN] Would place GTT %s for %s", trigger_id, kwargs.get('tradingsymbol'))
+        return {'trigger_id': trigger_id}
+    
+    def delete_gtt(self, trigger_id):
+        """
+        Log the GTT that would be deleted
+        
+        Args:
+            trigger_id (int): ID of the GTT to delete
+            
+        Returns:
+            dict: Response echoing the trigger_id
+        """
+        logger.info("[DRY RUN] Would delete GTT %s", trigger_id)
+        return {'trigger_id': trigger_id}
+
+@functools.lru_cache(maxsize=1)
 def get_mock_kite_client():
     """
     Create a mock Kite Connect client for dry run mode
     
+    The client is created once and reused by later dry runs in the same process.
+    
     Returns:
-        Mock: Mock client with basic functionality for testing
+        MockKiteClient: Mock client with basic functionality for testing
     """
-    from unittest.mock import Mock
-    
-    mock_client = Mock()
-    mock_client.name = "MockKiteClient"
+    mock_client = MockKiteClient()
     logger.info("Created mock Kite Connect client for dry run mode")
     return mock_client
 
+@functools.lru_cache(maxsize=1)
 def get_mock_portfolio_with_ltp():
     """
     Generate mock portfolio data for dry run testing
 
-    LTP increased for TCS to test the strategy
+    LTP increased for TCS to test the strategy. The portfolio is built once
+    and shared by later dry runs; Holding objects are immutable.
     
     Returns:
-        list: Mock portfolio holdings with LTP data
-    """
-    mock_portfolio = [
-        {
-            'tradingsymbol': 'RELIANCE',
-            'quantity': 100,
-            'last_price': 2650.0,
-            'instrument_token': 738561,
-            'exchange': 'NSE',
-            'product': 'CNC'
-        },
-        {
-            'tradingsymbol': 'TCS',
-            'quantity': 50,
-            'last_price': 3700.0,
-            'instrument_token': 2953217,
-            'exchange': 'NSE',
-            'product': 'CNC'
-        },
-        {
-            'tradingsymbol': 'INFY',
-            'quantity': 75,
-            'last_price': 1450.0,
-            'instrument_token': 408065,
-            'exchange': 'NSE',
-            'product': 'CNC'
-        },
-        {
-            'tradingsymbol': 'HDFC',
-            'quantity': 25,
-            'last_price': 1580.0,
-            'instrument_token': 340481,
-            'exchange': 'NSE',
-            'product': 'CNC'
-        }
-    ]
+        tuple: Mock portfolio Holding objects with LTP data
+    """
+    mock_portfolio = (
+        Holding(tradingsymbol='RELIANCE', quantity=100, last_price=2650.0, exchange='NSE'),
+        Holding(tradingsymbol='TCS', quantity=50, last_price=3700.0, exchange='NSE'),
+        Holding(tradingsymbol='INFY', quantity=75, last_price=1450.0, exchange='NSE'),
+        Holding(tradingsymbol='HDFC', quantity=25, last_price=1580.0, exchange='NSE')
+    )
     
-    logger.info(f"Generated mock portfolio with {len(mock_portfolio)} holdings")
+    logger.info("Generated mock portfolio with %s holdings", len(mock_portfolio))
     return mock_portfolio
 
 def get_portfolio_with_ltp(kite_client):
@@ -262,112 +557,119 @@ def get_portfolio_with_ltp(kite_client):
         kite_client: Kite Connect client instance
         
     Returns:
-        list: List of dictionaries containing tradingsymbol, quantity, and last_price
-              for equity holdings with quantity > 0
+        list: Holding objects for equity holdings with quantity > 0 and LTP data
     """
     try:
         # Get all holdings
         holdings = kite_client.holdings()
-        logger.info(f"Retrieved {len(holdings)} total holdings")
+        logger.info("Retrieved %s total holdings", len(holdings))
         
         # Filter for equity instruments with quantity > 0
         equity_holdings = [
             holding for holding in holdings 
             if holding.get('instrument_type') == 'EQ' and holding.get('quantity', 0) > 0
         ]
-        logger.info(f"Found {len(equity_holdings)} equity holdings with quantity > 0")
+        logger.info("Found %s equity holdings with quantity > 0", len(equity_holdings))
         
         if not equity_holdings:
             logger.info("No equity holdings found")
             return []
         
-        # Extract tradingsymbols for LTP lookup
-        tradingsymbols = [holding['tradingsymbol'] for holding in equity_holdings]
-        logger.info(f"Fetching LTP for symbols: {tradingsymbols}")
+        # Build fully-qualified "EXCHANGE:TRADINGSYMBOL" keys for a single batched LTP lookup;
+        # the resolved exchanges are reused for the Holding objects below
+        exchanges = [holding.get('exchange') or 'NSE' for holding in equity_holdings]
+        instrument_keys = [
+            f"{exchange}:{holding['tradingsymbol']}"
+            for holding, exchange in zip(equity_holdings, exchanges)
+        ]
+        logger.info("Fetching LTP for %s instruments", len(instrument_keys))
+        logger.debug("LTP instruments: %s", instrument_keys)
         
         # Get LTP for all equity holdings
-        ltp_data = kite_client.ltp(tradingsymbols)
-        logger.info(f"Retrieved LTP data for {len(ltp_data)} instruments")
+        ltp_data = kite_client.ltp(instrument_keys)
+        logger.info("Retrieved LTP data for %s instruments", len(ltp_data))
         
-        # Merge LTP data back into holdings
+        # Keep only the fields the strategy uses, together with the LTP
         portfolio_with_ltp = []
-        for holding in equity_holdings:
+        for holding, exchange, instrument_key in zip(equity_holdings, exchanges, instrument_keys):
             tradingsymbol = holding['tradingsymbol']
-            if tradingsymbol in ltp_data:
-                # Create merged dictionary with required fields
-                merged_holding = {
-                    'tradingsymbol': tradingsymbol,
-                    'quantity': holding['quantity'],
-                    'last_price': ltp_data[tradingsymbol]['last_price'],
-                    'instrument_token': holding.get('instrument_token'),
-                    'exchange': holding.get('exchange'),
-                    'product': holding.get('product'),
-                    'collateral_quantity': holding.get('collateral_quantity', 0),
-                    'collateral_type': holding.get('collateral_type'),
-                    't1_quantity': holding.get('t1_quantity', 0),
-                    'average_price': holding.get('average_price', 0),
-                    'day_change': holding.get('day_change', 0),
-                    'day_change_percentage': holding.get('day_change_percentage', 0),
-                    'pnl': holding.get('pnl', 0),
-                    'pnl_percentage': holding.get('pnl_percentage', 0)
-                }
-                portfolio_with_ltp.append(merged_holding)
-                logger.debug(f"Added {tradingsymbol}: qty={holding['quantity']}, ltp={ltp_data[tradingsymbol]['last_price']}")
+            ltp = ltp_data.get(instrument_key)
+            if ltp:
+                portfolio_with_ltp.append(Holding(
+                    tradingsymbol=tradingsymbol,
+                    quantity=holding['quantity'],
+                    last_price=ltp['last_price'],
+                    exchange=exchange
+                ))
+                logger.debug("Added %s: qty=%s, ltp=%s", tradingsymbol, holding['quantity'], ltp['last_price'])
             else:
-                logger.warning(f"LTP data not found for {tradingsymbol}")
+                logger.warning("LTP data not found for %s", tradingsymbol)
         
-        logger.info(f"Successfully merged portfolio data for {len(portfolio_with_ltp)} holdings")
+        logger.info("Successfully merged portfolio data for %s holdings", len(portfolio_with_ltp))
         return portfolio_with_ltp
         
     except Exception as e:
-        logger.error(f"Error getting portfolio with LTP: {e}")
+        logger.error("Error getting portfolio with LTP: %s", e)
         raise
 
-def cancel_existing_gtts(kite_client, tradingsymbol, active_gtts_list):
+def index_active_gtts(gtts):
+    """
+    Index active GTTs by trading symbol
+    
+    Args:
+        gtts (list): List of all GTTs from kite_client.get_gtts()
+        
+    Returns:
+        dict: Mapping of tradingsymbol to the list of its GTTs with status 'active'
+    """
+    gtt_index = defaultdict(list)
+    for gtt in gtts:
+        if gtt.get('status') == 'active':
+            gtt_index[gtt.get('tradingsymbol')].append(gtt)
+    return dict(gtt_index)
+
+def cancel_existing_gtts(kite_client, tradingsymbol, gtt_index):
     """
     Cancel all active GTTs for a specific trading symbol
     
     Args:
         kite_client: Kite Connect client instance
         tradingsymbol (str): Trading symbol to cancel GTTs for
-        active_gtts_list (list): List of all active GTTs from kite_client.get_gtts()
+        gtt_index (dict): Active GTTs keyed by tradingsymbol, from index_active_gtts()
         
     Returns:
         int: Number of GTTs canceled
     """
     try:
-        # Find all active GTTs for the specified trading symbol
-        matching_gtts = [
-            gtt for gtt in active_gtts_list 
-            if gtt.get('tradingsymbol') == tradingsymbol and gtt.get('status') == 'active'
-        ]
+        matching_gtts = gtt_index.get(tradingsymbol, ())
         
         if not matching_gtts:
-            logger.info(f"No active GTTs found for {tradingsymbol}")
+            logger.info("No active GTTs found for %s", tradingsymbol)
             return 0
         
         canceled_count = 0
-        logger.info(f"Found {len(matching_gtts)} active GTT(s) for {tradingsymbol}")
+        logger.info("Found %s active GTT(s) for %s", len(matching_gtts), tradingsymbol)
         
         # Cancel each matching GTT
         for gtt in matching_gtts:
             trigger_id = gtt.get('trigger_id')
             if trigger_id:
                 try:
-                    logger.info(f"Canceling GTT for {tradingsymbol} - Trigger ID: {trigger_id}")
+                    logger.info("Canceling GTT for %s - Trigger ID: %s", tradingsymbol, trigger_id)
+                    api_rate_limiter.acquire()
                     kite_client.delete_gtt(trigger_id=trigger_id)
                     canceled_count += 1
-                    logger.info(f"Successfully canceled GTT {trigger_id} for {tradingsymbol}")
+                    logger.info("Successfully canceled GTT %s for %s", trigger_id, tradingsymbol)
                 except Exception as e:
-                    logger.error(f"Failed to cancel GTT {trigger_id} for {tradingsymbol}: {e}")
+                    logger.error("Failed to cancel GTT %s for %s: %s", trigger_id, tradingsymbol, e)
             else:
-                logger.warning(f"GTT for {tradingsymbol} missing trigger_id: {gtt}")
+                logger.warning("GTT for %s missing trigger_id: %s", tradingsymbol, gtt)
         
-        logger.info(f"Canceled {canceled_count} GTT(s) for {tradingsymbol}")
+        logger.info("Canceled %s GTT(s) for %s", canceled_count, tradingsymbol)
         return canceled_count
         
     except Exception as e:
-        logger.error(f"Error canceling GTTs for {tradingsymbol}: {e}")
+        logger.error("Error canceling GTTs for %s: %s", tradingsymbol, e)
         raise
 
 def place_new_gtts(kite_client, plan):
@@ -376,93 +678,153 @@ def place_new_gtts(kite_client, plan):
     
     Args:
         kite_client: Kite Connect client instance
-        plan (dict): Plan dictionary with action == 'UPDATE' containing tier1 and tier2 data
+        plan (Plan): Plan with action == 'UPDATE' containing tier1 and tier2 data
         
     Returns:
         int: Number of GTTs placed successfully
     """
     try:
-        if plan.get('action') != 'UPDATE':
-            logger.warning(f"Invalid plan action: {plan.get('action')}. Expected 'UPDATE'")
+        if plan.action != 'UPDATE':
+            logger.warning("Invalid plan action: %s. Expected 'UPDATE'", plan.action)
             return 0
         
-        symbol = plan.get('symbol')
-        exchange = plan.get('exchange', 'NSE')  # Default to NSE if not specified
-        tier1 = plan.get('tier1', {})
-        tier2 = plan.get('tier2', {})
+        symbol = plan.symbol
+        exchange = plan.exchange or 'NSE'  # Default to NSE if not specified
+        tier1 = plan.tier1
+        tier2 = plan.tier2
         
         if not symbol:
             logger.error("Plan missing required 'symbol' field")
             return 0
         
         placed_count = 0
-        logger.info(f"Placing new GTTs for {symbol}")
+        logger.info("Placing new GTTs for %s", symbol)
         
         # Place Tier 1 GTT if quantity > 0
-        tier1_qty = tier1.get('qty', 0)
+        tier1_qty = tier1.qty if tier1 else 0
         if tier1_qty > 0:
             try:
-                logger.info(f"Placing Tier 1 GTT for {symbol}: qty={tier1_qty}, trigger={tier1.get('trigger')}, limit={tier1.get('limit')}")
+                logger.info("Placing Tier 1 GTT for %s: qty=%s, trigger=%s, limit=%s", symbol, tier1_qty, tier1.trigger, tier1.limit)
+                api_rate_limiter.acquire()
                 kite_client.place_gtt(
                     trigger_type='single',
                     tradingsymbol=symbol,
                     exchange=exchange,
-                    trigger_values=[tier1.get('trigger')],
-                    last_price=tier1.get('trigger'),
+                    trigger_values=[tier1.trigger],
+                    last_price=tier1.trigger,
                     orders=[{
                         'transaction_type': 'SELL',
                         'quantity': tier1_qty,
-                        'price': tier1.get('limit'),
+                        'price': tier1.limit,
                         'order_type': 'LIMIT',
                         'product': 'CNC'
                     }]
                 )
                 placed_count += 1
-                logger.info(f"Successfully placed Tier 1 GTT for {symbol}")
+                logger.info("Successfully placed Tier 1 GTT for %s", symbol)
             except Exception as e:
-                logger.error(f"Failed to place Tier 1 GTT for {symbol}: {e}")
+                logger.error("Failed to place Tier 1 GTT for %s: %s", symbol, e)
         else:
-            logger.info(f"Skipping Tier 1 GTT for {symbol}: quantity is 0")
+            logger.info("Skipping Tier 1 GTT for %s: quantity is 0", symbol)
         
         # Place Tier 2 GTT if quantity > 0
-        tier2_qty = tier2.get('qty', 0)
+        tier2_qty = tier2.qty if tier2 else 0
         if tier2_qty > 0:
             try:
-                logger.info(f"Placing Tier 2 GTT for {symbol}: qty={tier2_qty}, trigger={tier2.get('trigger')}, limit={tier2.get('limit')}")
+                logger.info("Placing Tier 2 GTT for %s: qty=%s, trigger=%s, limit=%s", symbol, tier2_qty, tier2.trigger, tier2.limit)
+                api_rate_limiter.acquire()
                 kite_client.place_gtt(
                     trigger_type='single',
                     tradingsymbol=symbol,
                     exchange=exchange,
-                    trigger_values=[tier2.get('trigger')],
-                    last_price=tier2.get('trigger'),
+                    trigger_values=[tier2.trigger],
+                    last_price=tier2.trigger,
                     orders=[{
                         'transaction_type': 'SELL',
                         'quantity': tier2_qty,
-                        'price': tier2.get('limit'),
+                        'price': tier2.limit,
                         'order_type': 'LIMIT',
                         'product': 'CNC'
                     }]
                 )
                 placed_count += 1
-                logger.info(f"Successfully placed Tier 2 GTT for {symbol}")
+                logger.info("Successfully placed Tier 2 GTT for %s", symbol)
             except Exception as e:
-                logger.error(f"Failed to place Tier 2 GTT for {symbol}: {e}")
+                logger.error("Failed to place Tier 2 GTT for %s: %s", symbol, e)
         else:
-            logger.info(f"Skipping Tier 2 GTT for {symbol}: quantity is 0")
+            logger.info("Skipping Tier 2 GTT for %s: quantity is 0", symbol)
         
-        logger.info(f"Placed {placed_count} new GTT(s) for {symbol}")
+        logger.info("Placed %s new GTT(s) for %s", placed_count, symbol)
         return placed_count
         
     except Exception as e:
-        logger.error(f"Error placing new GTTs for plan: {e}")
+        logger.error("Error placing new GTTs for plan: %s", e)
         raise
 
+def execute_plan(kite_client, plan, gtt_index):
+    """
+    Execute a single UPDATE plan: cancel the symbol's existing GTTs, then place new ones
+    
+    Args:
+        kite_client: Kite Connect client instance
+        plan (Plan): Plan with action == 'UPDATE'
+        gtt_index (dict): Active GTTs keyed by tradingsymbol, from index_active_gtts()
+        
+    Returns:
+        int: Number of GTTs placed successfully
+    """
+    symbol = plan.symbol
+    logger.info("Processing UPDATE for %s...", symbol)
+    
+    # Cancel existing GTTs for this symbol
+    canceled_count = cancel_existing_gtts(kite_client, symbol, gtt_index)
+    logger.info("Canceled %s existing GTT(s) for %s", canceled_count, symbol)
+    
+    # Place new GTTs
+    placed_count = place_new_gtts(kite_client, plan)
+    logger.info("Placed %s new GTT(s) for %s", placed_count, symbol)
+    
+    return placed_count
+
+# Report layout used by format_gtt_report
+REPORT_HEADER = "=" * 80 + "\nGTT STOP-LOSS STRATEGY - DRY RUN REPORT\n" + "=" * 80 + "\n\n"
+REPORT_SUMMARY_TEMPLATE = "SUMMARY: {total} holdings analyzed | {updates} updates planned | {no_actions} no action\n\n"
+REPORT_UPDATE_SECTION_HEADER = "🔄 ACTIONS REQUIRED:\n" + "-" * 40 + "\n"
+REPORT_UPDATE_TEMPLATE = (
+    "{symbol}: ACTION_UPDATE | New High: ₹{new_high}\n"
+    "  └─ Tier 1: {tier1.qty} shares @ Trigger: ₹{tier1.trigger}, Limit: ₹{tier1.limit}\n"
+    "  └─ Tier 2: {tier2.qty} shares @ Trigger: ₹{tier2.trigger}, Limit: ₹{tier2.limit}\n"
+    "\n"
+)
+REPORT_NO_ACTION_SECTION_HEADER = "✅ NO ACTION REQUIRED:\n" + "-" * 40 + "\n"
+REPORT_NO_ACTION_TEMPLATE = "{symbol}: NO_ACTION | {reason}\n"
+REPORT_FOOTER = "=" * 80 + "\nEnd of Report\n" + "=" * 80
+
+def partition_plans(plans):
+    """
+    Split plans by action type in a single pass
+    
+    Args:
+        plans (list): List of Plan objects
+        
+    Returns:
+        tuple: (update_plans, no_action_plans) lists, each in the original plan order
+    """
+    update_plans = []
+    no_action_plans = []
+    for plan in plans:
+        if plan.action == 'UPDATE':
+            update_plans.append(plan)
+        elif plan.action == 'NO_ACTION':
+            no_action_plans.append(plan)
+    return update_plans, no_action_plans
+
 def format_gtt_report(plans):
     """
     Format GTT plans into a human-readable console report
     
     Args:
-        plans (list): List of GTT plan dictionaries
+        plans (list): List of Plan objects
         
     Returns:
         str: Formatted report string
@@ -470,53 +832,39 @@ def format_gtt_report(plans):
     if not plans:
         return "No GTT plans generated."
     
-    report_lines = []
-    report_lines.append("=" * 80)
-    report_lines.append("GTT STOP-LOSS STRATEGY - DRY RUN REPORT")
-    report_lines.append("=" * 80)
-    report_lines.append("")
-    
-    # Count actions
-    update_count = sum(1 for plan in plans if plan['action'] == 'UPDATE')
-    no_action_count = sum(1 for plan in plans if plan['action'] == 'NO_ACTION')
+    report = io.StringIO()
+    write = report.write
+    write(REPORT_HEADER)
     
-    report_lines.append(f"SUMMARY: {len(plans)} holdings analyzed | {update_count} updates planned | {no_action_count} no action")
-    report_lines.append("")
+    update_plans, no_action_plans = partition_plans(plans)
     
-    # Group plans by action type
-    update_plans = [plan for plan in plans if plan['action'] == 'UPDATE']
-    no_action_plans = [plan for plan in plans if plan['action'] == 'NO_ACTION']
+    write(REPORT_SUMMARY_TEMPLATE.format(
+        total=len(plans),
+        updates=len(update_plans),
+        no_actions=len(no_action_plans)
+    ))
     
     # Report UPDATE actions first
     if update_plans:
-        report_lines.append("🔄 ACTIONS REQUIRED:")
-        report_lines.append("-" * 40)
+        write(REPORT_UPDATE_SECTION_HEADER)
         for plan in update_plans:
-            symbol = plan['symbol']
-            new_high = plan['new_high']
-            tier1 = plan['tier1']
-            tier2 = plan['tier2']
-            
-            report_lines.append(f"{symbol}: ACTION_UPDATE | New High: ₹{new_high}")
-            report_lines.append(f"  └─ Tier 1: {tier1['qty']} shares @ Trigger: ₹{tier1['trigger']}, Limit: ₹{tier1['limit']}")
-            report_lines.append(f"  └─ Tier 2: {tier2['qty']} shares @ Trigger: ₹{tier2['trigger']}, Limit: ₹{tier2['limit']}")
-            report_lines.append("")
+            write(REPORT_UPDATE_TEMPLATE.format(
+                symbol=plan.symbol,
+                new_high=plan.new_high,
+                tier1=plan.tier1,
+                tier2=plan.tier2
+            ))
         
     # Report NO_ACTION items
     if no_action_plans:
-        report_lines.append("✅ NO ACTION REQUIRED:")
-        report_lines.append("-" * 40)
+        write(REPORT_NO_ACTION_SECTION_HEADER)
         for plan in no_action_plans:
-            symbol = plan['symbol']
-            reason = plan['reason']
-            report_lines.append(f"{symbol}: NO_ACTION | {reason}")
-        report_lines.append("")
+            write(REPORT_NO_ACTION_TEMPLATE.format(symbol=plan.symbol, reason=plan.reason))
+        write("\n")
     
-    report_lines.append("=" * 80)
-    report_lines.append("End of Report")
-    report_lines.append("=" * 80)
+    write(REPORT_FOOTER)
     
-    return "\n".join(report_lines)
+    return report.getvalue()
 
 def main_live_run():
     """
@@ -541,70 +889,69 @@ def main_live_run():
         # 2. Load current GTT state
         logger.info("Step 2: Loading GTT state...")
         gtt_state = load_gtt_state(config.STATE_FILE_PATH)
-        logger.info(f"Loaded state for {len(gtt_state)} symbols")
+        logger.info("Loaded state for %s symbols", len(gtt_state))
         
         # 3. Get portfolio with LTP
         logger.info("Step 3: Getting portfolio data with LTP...")
         portfolio = get_portfolio_with_ltp(kite_client)
-        logger.info(f"Retrieved portfolio with {len(portfolio)} holdings")
+        logger.info("Retrieved portfolio with %s holdings", len(portfolio))
         
         # 4. Get all active GTTs
         logger.info("Step 4: Getting active GTTs...")
         active_gtts = kite_client.get_gtts()
-        logger.info(f"Retrieved {len(active_gtts)} active GTTs")
+        logger.info("Retrieved %s active GTTs", len(active_gtts))
+        gtt_index = index_active_gtts(active_gtts)
         
         # 5. Plan GTT updates
         logger.info("Step 5: Planning GTT updates...")
         plans = plan_gtt_updates(portfolio, gtt_state, config)
-        logger.info(f"Generated {len(plans)} GTT plans")
+        logger.info("Generated %s GTT plans", len(plans))
         
         # 6. Execute plans
         logger.info("Step 6: Executing GTT plans...")
         update_count = 0
         
-        for plan in plans:
-            if plan['action'] == 'UPDATE':
-                symbol = plan['symbol']
-                logger.info(f"Processing UPDATE for {symbol}...")
-                
+        update_plans, no_action_plans = partition_plans(plans)
+        logger.info("%s plan(s) to execute, skipping %s with no action", len(update_plans), len(no_action_plans))
+        
+        # Each symbol's cancel + place sequence runs serially on one worker,
+        # different symbols run concurrently
+        with ThreadPoolExecutor(max_workers=MAX_EXECUTION_WORKERS) as executor:
+            futures = [
+                (plan, executor.submit(execute_plan, kite_client, plan, gtt_index))
+                for plan in update_plans
+            ]
+            
+            for plan, future in futures:
+                symbol = plan.symbol
                 try:
-                    # Cancel existing GTTs for this symbol
-                    canceled_count = cancel_existing_gtts(kite_client, symbol, active_gtts)
-                    logger.info(f"Canceled {canceled_count} existing GTT(s) for {symbol}")
-                    
-                    # Place new GTTs
-                    placed_count = place_new_gtts(kite_client, plan)
-                    logger.info(f"Placed {placed_count} new GTT(s) for {symbol}")
+                    future.result()
                     
                     # Update local GTT state
-                    gtt_state[symbol] = {'last_high_price': plan['new_high']}
-                    logger.info(f"Updated state for {symbol}: last_high_price={plan['new_high']}")
+                    gtt_state[symbol] = {'last_high_price': plan.new_high}
+                    logger.info("Updated state for %s: last_high_price=%s", symbol, plan.new_high)
                     
                     update_count += 1
                     
                 except Exception as e:
-                    logger.error(f"[{symbol}]: FAILED to process. Error: {e}")
+                    logger.error("[%s]: FAILED to process. Error: %s", symbol, e)
                     # Continue with other symbols even if one fails
                     continue
-            else:
-                try:
-                    logger.debug(f"Skipping {plan['symbol']}: action={plan['action']}")
-                except Exception as e:
-                    logger.error(f"[{plan.get('symbol', 'UNKNOWN')}]: FAILED to process. Error: {e}")
-                    continue
         
-        # 7. Save updated GTT state
+        # 7. Save updated GTT state, only rewriting the file when something changed
         logger.info("Step 7: Saving updated GTT state...")
-        if save_gtt_state(config.STATE_FILE_PATH, gtt_state):
+        if not update_count:
+            logger.info("No state changes, leaving %s untouched", config.STATE_FILE_PATH)
+        elif save_gtt_state(config.STATE_FILE_PATH, gtt_state):
             logger.info("Successfully saved updated GTT state")
         else:
             logger.error("Failed to save GTT state")
         
-        logger.info(f"Live run completed successfully. Processed {update_count} updates.")
+        logger.info("Live run completed successfully. Processed %s updates.", update_count)
         return plans
         
     except Exception as e:
-        logger.error(f"Error during live run: {e}")
+        logger.error("Error during live run: %s", e)
         print(f"\n❌ Live run failed: {e}\n")
         raise
 
@@ -629,32 +976,30 @@ def main_dry_run():
         # 2. Load current GTT state
         logger.info("Step 2: Loading GTT state...")
         gtt_state = load_gtt_state(config.TEST_STATE_FILE_PATH)
-        logger.info(f"Loaded state for {len(gtt_state)} symbols")
+        logger.info("Loaded state for %s symbols", len(gtt_state))
         
         # 3. Get portfolio with LTP (using mock data for dry run)
         logger.info("Step 3: Getting portfolio data...")
         portfolio = get_mock_portfolio_with_ltp()
-        logger.info(f"Retrieved portfolio with {len(portfolio)} holdings")
+        logger.info("Retrieved portfolio with %s holdings", len(portfolio))
         
         # 4. Plan GTT updates
         logger.info("Step 4: Planning GTT updates...")
         plans = plan_gtt_updates(portfolio, gtt_state, config)
-        logger.info(f"Generated {len(plans)} GTT plans")
+        logger.info("Generated %s GTT plans", len(plans))
         
         # 5. Generate and print formatted report
         logger.info("Step 5: Generating report...")
         report = format_gtt_report(plans)
         
-        # Print report to console
-        print("\n")
-        print(report)
-        print("\n")
+        # Print report to console in a single write
+        print(f"\n\n{report}\n\n")
         
         logger.info("Dry run completed successfully")
         return plans
         
     except Exception as e:
-        logger.error(f"Error during dry run: {e}")
+        logger.error("Error during dry run: %s", e)
         print(f"\n❌ Dry run failed: {e}\n")
         raise
 
@@ -7,42 +7,281 @@ import unittest
 import json
 import logging
 import os
+import queue
+import stat
+import subprocess
+import sys
 import tempfile
-from unittest.mock import Mock, patch, mock_open
+from dataclasses import replace
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from types import MappingProxyType, SimpleNamespace
+from unittest.mock import Mock, patch
 import config
 import main
 
+class StubKiteClient:
+    """
+    Minimal Kite client for the cancel/place tests that records the GTT calls made on it
+    
+    When error is set, every recorded call raises it instead of succeeding.
+    """
+    
+    __slots__ = ('error', 'place_calls', 'delete_calls')
+    
+    def __init__(self, error=None):
+        self.error = error
+        self.place_calls = []
+        self.delete_calls = []
+    
+    def place_gtt(self, **kwargs):
+        self.place_calls.append(kwargs)
+        if self.error:
+            raise self.error
+        return {'trigger_id': len(self.place_calls)}
+    
+    def delete_gtt(self, trigger_id):
+        self.delete_calls.append(trigger_id)
+        if self.error:
+            raise self.error
+        return {'trigger_id': trigger_id}
+
 class TestGTTStrategy(unittest.TestCase):
     """Test cases for GTT strategy functionality"""
     
+    # Strategy parameters shared by the plan_gtt_updates tests
+    TIER_CONFIG = SimpleNamespace(
+        TIER_1_QTY_PCT=0.30,
+        TIER_1_TRIGGER_PCT=0.10,
+        TIER_1_LIMIT_PCT=0.11,
+        TIER_2_TRIGGER_PCT=0.20,
+        TIER_2_LIMIT_PCT=0.21
+    )
+    
+    # Active GTTs across several symbols shared by the cancel_existing_gtts tests,
+    # read-only so one test cannot leak changes into another
+    ACTIVE_GTTS = (
+        MappingProxyType({
+            'trigger_id': 'gtt_001',
+            'tradingsymbol': 'RELIANCE',
+            'status': 'active',
+            'trigger_type': 'single',
+            'trigger_values': [2500.0],
+            'last_price': 2600.0
+        }),
+        MappingProxyType({
+            'trigger_id': 'gtt_002',
+            'tradingsymbol': 'RELIANCE',
+            'status': 'active',
+            'trigger_type': 'single',
+            'trigger_values': [2400.0],
+            'last_price': 2600.0
+        }),
+        MappingProxyType({
+            'trigger_id': 'gtt_003',
+            'tradingsymbol': 'TCS',
+            'status': 'active',
+            'trigger_type': 'single',
+            'trigger_values': [3500.0],
+            'last_price': 3600.0
+        }),
+        MappingProxyType({
+            'trigger_id': 'gtt_004',
+            'tradingsymbol': 'RELIANCE',
+            'status': 'cancelled',  # Should be ignored (not active)
+            'trigger_type': 'single',
+            'trigger_values': [2300.0],
+            'last_price': 2600.0
+        }),
+        MappingProxyType({
+            'trigger_id': 'gtt_005',
+            'tradingsymbol': 'INFY',
+            'status': 'active',
+            'trigger_type': 'single',
+            'trigger_values': [1400.0],
+            'last_price': 1450.0
+        })
+    )
+    ACTIVE_GTTS_WITHOUT_TRIGGER_ID = (
+        MappingProxyType({
+            'tradingsymbol': 'RELIANCE',
+            'status': 'active',
+            'trigger_type': 'single',
+            'trigger_values': [2500.0],
+            'last_price': 2600.0
+        }),
+    )
+    
+    # UPDATE plan with both tiers placeable, shared by the place_new_gtts tests;
+    # Plan is frozen, so tests derive their variants with dataclasses.replace
+    UPDATE_PLAN = main.Plan(
+        symbol='RELIANCE',
+        action='UPDATE',
+        exchange='NSE',
+        new_high=2600.0,
+        tier1=main.Tier(qty=30, trigger=2340.0, limit=2314.0),
+        tier2=main.Tier(qty=70, trigger=2080.0, limit=2054.0)
+    )
+    
+    # Kite holdings response used by the get_portfolio_with_ltp tests: one valid
+    # equity holding plus one zero-quantity equity and one mutual fund to filter out
+    KITE_HOLDINGS = (
+        MappingProxyType({
+            'tradingsymbol': 'RELIANCE',
+            'instrument_type': 'EQ',
+            'quantity': 10,  # Valid EQ stock with quantity > 0
+            'instrument_token': 738561,
+            'exchange': 'NSE',
+            'product': 'CNC',
+            'average_price': 2500.0
+        }),
+        MappingProxyType({
+            'tradingsymbol': 'TCS',
+            'instrument_type': 'EQ',
+            'quantity': 0,  # EQ stock with quantity = 0 (should be filtered out)
+            'instrument_token': 2953217,
+            'exchange': 'NSE',
+            'product': 'CNC',
+            'average_price': 3500.0
+        }),
+        MappingProxyType({
+            'tradingsymbol': 'HDFC_MF',
+            'instrument_type': 'MF',  # Mutual Fund (should be filtered out)
+            'quantity': 100,
+            'instrument_token': 123456,
+            'exchange': 'NSE',
+            'product': 'CNC',
+            'average_price': 1000.0
+        })
+    )
+    
+    # LTP response for the holdings above - only for the valid EQ stock
+    KITE_LTP = MappingProxyType({
+        'NSE:RELIANCE': MappingProxyType({'last_price': 2600.0})
+    })
+    
+    # Two UPDATE plans returned by the mocked planner in the main_live_run tests
+    LIVE_RUN_PLANS = (
+        main.Plan(
+            symbol='STOCK1',
+            action='UPDATE',
+            exchange='NSE',
+            new_high=1000.0,
+            tier1=main.Tier(qty=30, trigger=900.0, limit=890.0),
+            tier2=main.Tier(qty=70, trigger=800.0, limit=790.0)
+        ),
+        main.Plan(
+            symbol='STOCK2',
+            action='UPDATE',
+            exchange='NSE',
+            new_high=2000.0,
+            tier1=main.Tier(qty=15, trigger=1800.0, limit=1780.0),
+            tier2=main.Tier(qty=35, trigger=1600.0, limit=1580.0)
+        )
+    )
+    
     def setUp(self):
         """Set up test fixtures before each test method"""
-        self.temp_state_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json')
-        self.temp_state_file.write('{}')
-        self.temp_state_file.close()
+        main.get_kite_client.cache_clear()
         
     def tearDown(self):
         """Clean up after each test method"""
-        os.unlink(self.temp_state_file.name)
+        main.get_kite_client.cache_clear()
+    
+    def create_state_file(self, content='{}'):
+        """
+        Create a state file in a temporary directory of its own, removed when the test finishes
+        
+        Tests that list the file's directory then see only what save_gtt_state left there.
+        """
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        state_file = os.path.join(state_dir.name, 'gtt_state.json')
+        with open(state_file, 'w') as f:
+            f.write(content)
+        return state_file
     
     def test_config_loading(self):
         """Test that configuration values are loaded correctly"""
-        self.assertTrue(hasattr(config, 'DRY_RUN'))
-        self.assertTrue(hasattr(config, 'API_KEY'))
-        self.assertTrue(hasattr(config, 'TIER_1_QTY_PCT'))
+        missing = {'DRY_RUN', 'API_KEY', 'TIER_1_QTY_PCT'} - vars(config).keys()
+        self.assertFalse(missing, f"Missing config values: {missing}")
         self.assertEqual(config.TIER_1_QTY_PCT, 0.30)
     
     def test_kite_client_placeholder(self):
         """Test that get_kite_client function exists"""
         self.assertTrue(callable(getattr(main, 'get_kite_client')))
     
+    @patch('main.KiteConnect')
+    def test_get_kite_client_pools_connections_per_worker(self, mock_kite_class):
+        """Test get_kite_client sizes the HTTP connection pool to the execution workers"""
+        kite_client = main.get_kite_client()
+        
+        self.assertIs(kite_client, mock_kite_class.return_value)
+        pool = mock_kite_class.call_args.kwargs['pool']
+        self.assertEqual(pool['pool_maxsize'], main.MAX_EXECUTION_WORKERS)
+        kite_client.set_access_token.assert_called_once_with(config.ACCESS_TOKEN)
+    
+    @patch('main.KiteConnect')
+    def test_get_kite_client_is_created_once(self, mock_kite_class):
+        """Test get_kite_client reuses the client it created on the first call"""
+        kite_client = main.get_kite_client()
+        
+        self.assertIs(main.get_kite_client(), kite_client)
+        mock_kite_class.assert_called_once()
+    
     def test_logging_setup(self):
-        """Test that logging is properly configured"""
-        logger = logging.getLogger(__name__)
-        self.assertIsNotNone(logger)
-        # The logger level is 0 (NOTSET) by default, inheriting from root logger
-        # The root logger is configured to INFO level in main.py
-        self.assertEqual(logger.level, 0)  # NOTSET, inherits from root
+        """Test that main's queue and file formatters write log lines with one prefix"""
+        self.assertIs(main.logger, logging.getLogger('main'))
+        # The logger level is NOTSET, inheriting from the root logger configured in main.py
+        self.assertEqual(main.logger.level, logging.NOTSET)
+        
+        # Rebuild main's queue pipeline around a private file, leaving main's
+        # own listener and gtt_strategy.log untouched
+        with tempfile.TemporaryDirectory() as log_dir:
+            file_handler = RotatingFileHandler(os.path.join(log_dir, 'gtt_strategy.log'))
+            file_handler.setFormatter(main.log_file_handler.formatter)
+            log_queue = queue.SimpleQueue()
+            queue_handler = QueueHandler(log_queue)
+            queue_handler.setFormatter(main.log_queue_handler.formatter)
+            listener = QueueListener(log_queue, file_handler)
+            
+            queue_logger = logging.getLogger('test_strategy.queue')
+            queue_logger.propagate = False
+            queue_logger.setLevel(logging.INFO)
+            queue_logger.addHandler(queue_handler)
+            self.addCleanup(queue_logger.removeHandler, queue_handler)
+            
+            listener.start()
+            try:
+                queue_logger.info('queue check')
+            finally:
+                # Stopping the listener drains the queue into the file handler
+                listener.stop()
+                file_handler.close()
+            
+            with open(file_handler.baseFilename) as log_file:
+                log_lines = log_file.read().splitlines()
+        
+        self.assertEqual(len(log_lines), 1)
+        self.assertRegex(log_lines[0], r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3} - INFO - queue check$')
+    
+    def test_log_file_lines_have_single_prefix(self):
+        """Test that a fresh run writes log file lines with one timestamp and level prefix"""
+        # Run in a separate interpreter: under the test runner the root logger already
+        # has handlers, so main's basicConfig call would be a no-op here
+        message = 'log file check'
+        with tempfile.TemporaryDirectory() as log_dir:
+            subprocess.run(
+                [sys.executable, '-c', f'import main; main.logger.info({message!r})'],
+                cwd=log_dir,
+                env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)},
+                capture_output=True,
+                check=True
+            )
+            with open(os.path.join(log_dir, 'gtt_strategy.log')) as log_file:
+                log_lines = log_file.read().splitlines()
+        
+        self.assertEqual(len(log_lines), 1)
+        self.assertRegex(log_lines[0], rf'^\d{{4}}-\d\d-\d\d \d\d:\d\d:\d\d,\d{{3}} - INFO - {message}$')
     
     def test_state_file_path(self):
         """Test that state file path is correctly defined"""
@@ -50,96 +289,83 @@ class TestGTTStrategy(unittest.TestCase):
     
     def test_strategy_parameters(self):
         """Test that all strategy parameters are defined"""
-        expected_params = [
+        expected_params = {
             'TIER_1_QTY_PCT', 'TIER_1_TRIGGER_PCT', 'TIER_1_LIMIT_PCT',
             'TIER_2_TRIGGER_PCT', 'TIER_2_LIMIT_PCT'
-        ]
+        }
         
-        for param in expected_params:
-            self.assertTrue(hasattr(config, param), f"Missing parameter: {param}")
+        missing = expected_params - vars(config).keys()
+        self.assertFalse(missing, f"Missing parameters: {missing}")
     
     def test_get_portfolio_with_ltp(self):
-        """Test get_portfolio_with_ltp function with mocked data"""
-        # Mock holdings data with specific test cases
-        mock_holdings = [
-            {
-                'tradingsymbol': 'RELIANCE',
-                'instrument_type': 'EQ',
-                'quantity': 10,  # Valid EQ stock with quantity > 0
-                'instrument_token': 738561,
-                'exchange': 'NSE',
-                'product': 'CNC',
-                'average_price': 2500.0
-            },
-            {
-                'tradingsymbol': 'TCS',
-                'instrument_type': 'EQ',
-                'quantity': 0,  # EQ stock with quantity = 0 (should be filtered out)
-                'instrument_token': 2953217,
-                'exchange': 'NSE',
-                'product': 'CNC',
-                'average_price': 3500.0
-            },
-            {
-                'tradingsymbol': 'HDFC_MF',
-                'instrument_type': 'MF',  # Mutual Fund (should be filtered out)
-                'quantity': 100,
-                'instrument_token': 123456,
-                'exchange': 'NSE',
-                'product': 'CNC',
-                'average_price': 1000.0
-            }
+        """Test get_portfolio_with_ltp filters holdings and merges LTP with mocked data"""
+        # (case, holdings response, expected portfolio, expected LTP instrument keys or None if not queried)
+        test_cases = [
+            ('mixed holdings', list(self.KITE_HOLDINGS),
+             [main.Holding(tradingsymbol='RELIANCE', quantity=10, last_price=2600.0, exchange='NSE')],
+             ['NSE:RELIANCE']),  # Only RELIANCE should be queried for LTP
+            ('no equity holdings with quantity', list(self.KITE_HOLDINGS[1:]), [], None),
+            ('empty holdings', [], [], None),
         ]
         
-        # Mock LTP data - only for the valid EQ stock
-        mock_ltp = {
-            'RELIANCE': {'last_price': 2600.0}
-        }
-        
-        # Setup mock client
-        mock_client = Mock()
-        mock_client.holdings.return_value = mock_holdings
-        mock_client.ltp.return_value = mock_ltp
-        
-        # Call the function
-        result = main.get_portfolio_with_ltp(mock_client)
-        
-        # Assertions
-        self.assertEqual(len(result), 1)  # Only one valid EQ instrument with qty > 0
-        
-        # Check that only RELIANCE is returned (the valid EQ stock)
-        self.assertEqual(len(result), 1)
-        holding = result[0]
-        
-        # Verify the holding has correct data
-        self.assertEqual(holding['tradingsymbol'], 'RELIANCE')
-        self.assertEqual(holding['quantity'], 10)
-        self.assertEqual(holding['last_price'], 2600.0)
-        
-        # Verify API calls
-        mock_client.holdings.assert_called_once()
-        mock_client.ltp.assert_called_once_with(['RELIANCE'])  # Only RELIANCE should be queried for LTP
+        for case, holdings, expected_portfolio, expected_ltp_keys in test_cases:
+            with self.subTest(case=case):
+                mock_client = Mock(spec=['holdings', 'ltp'])
+                mock_client.holdings.return_value = holdings
+                mock_client.ltp.return_value = self.KITE_LTP
+                
+                result = main.get_portfolio_with_ltp(mock_client)
+                
+                self.assertEqual(result, expected_portfolio)
+                mock_client.holdings.assert_called_once()
+                if expected_ltp_keys is None:
+                    mock_client.ltp.assert_not_called()
+                else:
+                    mock_client.ltp.assert_called_once_with(expected_ltp_keys)
     
-    @patch('main.KiteConnect')
-    def test_get_portfolio_with_ltp_empty_holdings(self, mock_kite_class):
-        """Test get_portfolio_with_ltp with no equity holdings"""
-        mock_client = Mock()
-        mock_client.holdings.return_value = []
-        
-        result = main.get_portfolio_with_ltp(mock_client)
-        
-        self.assertEqual(result, [])
-        mock_client.holdings.assert_called_once()
-        mock_client.ltp.assert_not_called()
+    def test_get_mock_portfolio_with_ltp_is_cached_and_read_only(self):
+        """Test the mock portfolio is built once and cannot be mutated by callers"""
+        portfolio = main.get_mock_portfolio_with_ltp()
+        
+        self.assertIs(main.get_mock_portfolio_with_ltp(), portfolio)
+        self.assertEqual(len(portfolio), 4)
+        with self.assertRaises(AttributeError):
+            portfolio[0].last_price = 0
     
-    @patch('builtins.open', mock_open(read_data='{"RELIANCE": {"last_high_price": 2500}}'))
-    @patch('os.path.exists', return_value=True)
-    def test_load_gtt_state_file_exists(self, mock_exists):
+    def test_load_gtt_state_file_exists(self):
         """Test load_gtt_state with existing valid JSON file"""
-        result = main.load_gtt_state('test_state.json')
+        state_file = self.create_state_file('{"RELIANCE": {"last_high_price": 2500}}')
+        
+        result = main.load_gtt_state(state_file)
         expected = {"RELIANCE": {"last_high_price": 2500}}
         self.assertEqual(result, expected)
     
+    def test_load_gtt_state_whitespace_only_file(self):
+        """Test load_gtt_state treats a whitespace-only state file as empty"""
+        state_file = self.create_state_file('  \n')
+        
+        result = main.load_gtt_state(state_file)
+        self.assertEqual(result, {})
+    
+    def test_load_gtt_state_missing_file(self):
+        """Test load_gtt_state when the state file does not exist"""
+        with tempfile.TemporaryDirectory() as state_dir:
+            result = main.load_gtt_state(os.path.join(state_dir, 'missing.json'))
+        self.assertEqual(result, {})
+    
+    def test_load_gtt_state_empty_file(self):
+        """Test load_gtt_state with an existing but empty state file"""
+        state_file = self.create_state_file('')
+        
+        result = main.load_gtt_state(state_file)
+        self.assertEqual(result, {})
+    
+    def test_mock_kite_client_serves_mock_portfolio(self):
+        """Test get_portfolio_with_ltp works against the dry run MockKiteClient"""
+        result = main.get_portfolio_with_ltp(main.MockKiteClient())
+        
+        self.assertEqual(tuple(result), main.get_mock_portfolio_with_ltp())
+    
     @patch('builtins.open', side_effect=FileNotFoundError)
     def test_load_gtt_state_file_not_found(self, mock_open):
         """Test load_gtt_state with FileNotFoundError"""
@@ -147,62 +373,147 @@ class TestGTTStrategy(unittest.TestCase):
         self.assertEqual(result, {})
     
     def test_save_gtt_state(self):
-        """Test save_gtt_state with mocked file operations"""
+        """Test save_gtt_state writes the state file atomically"""
         test_data = {"RELIANCE": {"last_high_price": 2500}}
+        state_file = self.create_state_file()
+        state_dir = os.path.dirname(state_file)
+        files_before = set(os.listdir(state_dir))
         
-        with patch('os.makedirs') as mock_makedirs, \
-             patch('builtins.open', mock_open()) as mock_file:
-            
-            result = main.save_gtt_state('test_state.json', test_data)
+        result = main.save_gtt_state(state_file, test_data)
+        
+        self.assertTrue(result)
+        with open(state_file) as f:
+            self.assertEqual(json.load(f), test_data)
+        
+        # No temporary files should be left behind
+        self.assertEqual(set(os.listdir(state_dir)), files_before)
+
+    def test_save_gtt_state_keeps_file_permissions(self):
+        """Test save_gtt_state keeps an existing file's mode and gives new files the umask default"""
+        test_data = {"RELIANCE": {"last_high_price": 2500}}
+        state_file = self.create_state_file()
+        os.chmod(state_file, 0o640)
+        
+        self.assertTrue(main.save_gtt_state(state_file, test_data))
+        self.assertEqual(stat.S_IMODE(os.stat(state_file).st_mode), 0o640)
+        
+        umask = os.umask(0)
+        os.umask(umask)
+        with tempfile.TemporaryDirectory() as state_dir:
+            new_state_file = os.path.join(state_dir, 'gtt_state.json')
+        
+            self.assertTrue(main.save_gtt_state(new_state_file, test_data))
+            self.assertEqual(stat.S_IMODE(os.stat(new_state_file).st_mode), 0o666 & ~umask)
+    
+    @patch('main.os.fsync', side_effect=[None, OSError("fsync not supported")])
+    def test_save_gtt_state_directory_fsync_failure_still_saves(self, mock_fsync):
+        """Test save_gtt_state reports success when only the directory fsync after the rename fails"""
+        test_data = {"RELIANCE": {"last_high_price": 2500}}
+        state_file = self.create_state_file()
+        
+        with self.assertLogs(main.logger, level='WARNING') as logs:
+            result = main.save_gtt_state(state_file, test_data)
+        
+        self.assertTrue(result)
+        self.assertEqual(mock_fsync.call_count, 2)
+        self.assertIn("could not fsync its directory", logs.output[0])
+        with open(state_file) as f:
+            self.assertEqual(json.load(f), test_data)
+    
+    def test_save_gtt_state_bare_filename(self):
+        """Test save_gtt_state with a filename that has no directory component"""
+        test_data = {"RELIANCE": {"last_high_price": 2500}}
+        original_cwd = os.getcwd()
+        
+        with tempfile.TemporaryDirectory() as state_dir:
+            os.chdir(state_dir)
+            try:
+                result = main.save_gtt_state('gtt_state.json', test_data)
+            finally:
+                os.chdir(original_cwd)
             
             self.assertTrue(result)
-            mock_file.assert_called_once_with('test_state.json', 'w')
-            
-            # Verify the file was written with correct JSON using json.dump
-            # json.dump calls the file's write method multiple times, so we check if it was called
-            mock_file.return_value.write.assert_called()
+            with open(os.path.join(state_dir, 'gtt_state.json')) as f:
+                self.assertEqual(json.load(f), test_data)
     
-    def test_plan_gtt_updates_no_new_high(self):
-        """Test plan_gtt_updates when no new high is detected"""
-        # Mock portfolio data
-        portfolio = [
-            {
-                'tradingsymbol': 'TCS',
-                'last_price': 3000,
-                'quantity': 100
-            }
+    @patch('os.replace', side_effect=OSError("Disk error"))
+    def test_save_gtt_state_failed_replace_keeps_old_state(self, mock_replace):
+        """Test save_gtt_state leaves the previous state intact when the rename fails"""
+        state_file = self.create_state_file()
+        state_dir = os.path.dirname(state_file)
+        files_before = set(os.listdir(state_dir))
+        
+        result = main.save_gtt_state(state_file, {"RELIANCE": {"last_high_price": 2500}})
+        
+        self.assertFalse(result)
+        mock_replace.assert_called_once()
+        with open(state_file) as f:
+            self.assertEqual(json.load(f), {})
+        self.assertEqual(set(os.listdir(state_dir)), files_before)
+    
+    @patch('main.orjson', None)
+    def test_gtt_state_round_trip_without_orjson(self):
+        """Test load/save fall back to the stdlib json module when orjson is unavailable"""
+        test_data = {"RELIANCE": {"last_high_price": 2500}}
+        state_file = self.create_state_file()
+        
+        self.assertTrue(main.save_gtt_state(state_file, test_data))
+        
+        self.assertEqual(main.load_gtt_state(state_file), test_data)
+    
+    def test_get_tier_params(self):
+        """Test get_tier_params derives tier multipliers from the strategy parameters"""
+        params = main.get_tier_params(config)
+        
+        self.assertAlmostEqual(params.tier1_trigger_mult, 1 - config.TIER_1_TRIGGER_PCT)
+        self.assertAlmostEqual(params.tier1_limit_mult, 1 - config.TIER_1_LIMIT_PCT)
+        self.assertAlmostEqual(params.tier2_trigger_mult, 1 - config.TIER_2_TRIGGER_PCT)
+        self.assertAlmostEqual(params.tier2_limit_mult, 1 - config.TIER_2_LIMIT_PCT)
+        self.assertEqual(params.tier1_qty_pct, config.TIER_1_QTY_PCT)
+    
+    def test_plan_gtt_updates_actions(self):
+        """Test plan_gtt_updates picks the action for each holding in a mixed portfolio"""
+        # (symbol, last_price, state entry, expected action, expected reason)
+        test_cases = [
+            ('TCS', 3000, {'last_high_price': 3050}, 'NO_ACTION', 'LTP (3000) not a new high (3050)'),
+            ('NEWSTOCK', 1000, None, 'NO_ACTION', 'LTP (1000) not a new high (1000)'),  # Not in state yet
+            ('STOCK1', 2000, {'last_high_price': 1900}, 'UPDATE', ''),
+            ('STOCK2', 1500, {'last_high_price': 1600}, 'NO_ACTION', 'LTP (1500) not a new high (1600)'),
         ]
         
-        # Mock GTT state with higher price
+        portfolio = [
+            main.Holding(tradingsymbol=symbol, last_price=last_price, quantity=100)
+            for symbol, last_price, _, _, _ in test_cases
+        ]
         gtt_state = {
-            'TCS': {'last_high_price': 3050}
+            symbol: state
+            for symbol, _, state, _, _ in test_cases if state is not None
         }
         
-        # Mock config
-        mock_config = Mock()
-        mock_config.TIER_1_TRIGGER_PCT = 0.10
-        mock_config.TIER_1_LIMIT_PCT = 0.11
-        mock_config.TIER_2_TRIGGER_PCT = 0.20
-        mock_config.TIER_2_LIMIT_PCT = 0.21
-        mock_config.TIER_1_QTY_PCT = 0.30
-        
-        result = main.plan_gtt_updates(portfolio, gtt_state, mock_config)
-        
-        self.assertEqual(len(result), 1)
-        plan = result[0]
-        self.assertEqual(plan['symbol'], 'TCS')
-        self.assertEqual(plan['action'], 'NO_ACTION')
-        self.assertIn('LTP (3000) not a new high (3050)', plan['reason'])
+        result = main.plan_gtt_updates(portfolio, gtt_state, self.TIER_CONFIG)
+        
+        self.assertEqual(len(result), len(test_cases))
+        for plan, (symbol, last_price, state, expected_action, expected_reason) in zip(result, test_cases):
+            with self.subTest(symbol=symbol):
+                self.assertEqual(plan.symbol, symbol)
+                self.assertEqual(plan.action, expected_action)
+                self.assertEqual(plan.reason, expected_reason)
+                if expected_action == 'UPDATE':
+                    self.assertEqual(plan.new_high, last_price)
+                else:
+                    # NO_ACTION plans carry the prices their reason is built from
+                    last_high_price = state['last_high_price'] if state else last_price
+                    self.assertEqual((plan.current_price, plan.last_high_price), (last_price, last_high_price))
     
     def test_plan_gtt_updates_new_high(self):
         """Test plan_gtt_updates when new high is detected"""
         # Mock portfolio data
         portfolio = [
-            {
-                'tradingsymbol': 'RELIANCE',
-                'last_price': 2600,
-                'quantity': 100
-            }
+            main.Holding(
+                tradingsymbol='RELIANCE',
+                last_price=2600,
+                quantity=100
+            )
         ]
         
         # Mock GTT state with lower price
@@ -210,267 +521,123 @@ class TestGTTStrategy(unittest.TestCase):
             'RELIANCE': {'last_high_price': 2500}
         }
         
-        # Mock config
-        mock_config = Mock()
-        mock_config.TIER_1_TRIGGER_PCT = 0.10
-        mock_config.TIER_1_LIMIT_PCT = 0.11
-        mock_config.TIER_2_TRIGGER_PCT = 0.20
-        mock_config.TIER_2_LIMIT_PCT = 0.21
-        mock_config.TIER_1_QTY_PCT = 0.30
-        
-        result = main.plan_gtt_updates(portfolio, gtt_state, mock_config)
-        
-        self.assertEqual(len(result), 1)
-        plan = result[0]
-        self.assertEqual(plan['symbol'], 'RELIANCE')
-        self.assertEqual(plan['action'], 'UPDATE')
-        self.assertEqual(plan['new_high'], 2600)
-        
-        # Check tier1 calculations
-        self.assertEqual(plan['tier1']['qty'], 30)  # 100 * 0.30
-        self.assertEqual(plan['tier1']['trigger'], 2340.0)  # 2600 * (1 - 0.10)
-        self.assertEqual(plan['tier1']['limit'], 2314.0)  # 2600 * (1 - 0.11)
-        
-        # Check tier2 calculations
-        self.assertEqual(plan['tier2']['qty'], 70)  # 100 - 30
-        self.assertEqual(plan['tier2']['trigger'], 2080.0)  # 2600 * (1 - 0.20)
-        self.assertEqual(plan['tier2']['limit'], 2054.0)  # 2600 * (1 - 0.21)
-    
-    def test_plan_gtt_updates_new_holding(self):
-        """Test plan_gtt_updates for new holding (not in state)"""
-        # Mock portfolio data
-        portfolio = [
-            {
-                'tradingsymbol': 'NEWSTOCK',
-                'last_price': 1000,
-                'quantity': 50
-            }
-        ]
-        
-        # Empty GTT state (new holding)
-        gtt_state = {}
-        
-        # Mock config
-        mock_config = Mock()
-        mock_config.TIER_1_TRIGGER_PCT = 0.10
-        mock_config.TIER_1_LIMIT_PCT = 0.11
-        mock_config.TIER_2_TRIGGER_PCT = 0.20
-        mock_config.TIER_2_LIMIT_PCT = 0.21
-        mock_config.TIER_1_QTY_PCT = 0.30
-        
-        result = main.plan_gtt_updates(portfolio, gtt_state, mock_config)
+        result = main.plan_gtt_updates(portfolio, gtt_state, self.TIER_CONFIG)
         
-        self.assertEqual(len(result), 1)
-        plan = result[0]
-        self.assertEqual(plan['symbol'], 'NEWSTOCK')
-        self.assertEqual(plan['action'], 'NO_ACTION')
-        self.assertIn('LTP (1000) not a new high (1000)', plan['reason'])
+        # Tier 1: qty 100 * 0.30 = 30, trigger 2600 * (1 - 0.10) = 2340, limit 2600 * (1 - 0.11) = 2314
+        # Tier 2: qty 100 - 30 = 70, trigger 2600 * (1 - 0.20) = 2080, limit 2600 * (1 - 0.21) = 2054
+        self.assertEqual(result, [self.UPDATE_PLAN])
     
-    def test_plan_gtt_updates_mixed_scenarios(self):
-        """Test plan_gtt_updates with mixed scenarios (new high and no action)"""
-        # Mock portfolio data
+    def test_plan_gtt_updates_large_portfolio(self):
+        """Test plan_gtt_updates with a realistic 500-holding portfolio"""
+        # Even-numbered stocks are at a new high, odd-numbered ones are below their last high
         portfolio = [
-            {
-                'tradingsymbol': 'STOCK1',
-                'last_price': 2000,
-                'quantity': 100
-            },
-            {
-                'tradingsymbol': 'STOCK2',
-                'last_price': 1500,
-                'quantity': 50
-            }
+            main.Holding(tradingsymbol=f"STOCK{i}", last_price=1000.0 + i, quantity=10 + i)
+            for i in range(500)
         ]
-        
-        # Mock GTT state
         gtt_state = {
-            'STOCK1': {'last_high_price': 1900},  # New high
-            'STOCK2': {'last_high_price': 1600}   # No new high
+            f"STOCK{i}": {'last_high_price': 1000.0 + i + (1 if i % 2 else -1)}
+            for i in range(500)
         }
         
-        # Mock config
-        mock_config = Mock()
-        mock_config.TIER_1_TRIGGER_PCT = 0.10
-        mock_config.TIER_1_LIMIT_PCT = 0.11
-        mock_config.TIER_2_TRIGGER_PCT = 0.20
-        mock_config.TIER_2_LIMIT_PCT = 0.21
-        mock_config.TIER_1_QTY_PCT = 0.30
-        
-        result = main.plan_gtt_updates(portfolio, gtt_state, mock_config)
-        
-        self.assertEqual(len(result), 2)
+        result = main.plan_gtt_updates(portfolio, gtt_state, self.TIER_CONFIG)
         
-        # Check STOCK1 (new high)
-        stock1_plan = next(p for p in result if p['symbol'] == 'STOCK1')
-        self.assertEqual(stock1_plan['action'], 'UPDATE')
-        self.assertEqual(stock1_plan['new_high'], 2000)
-        
-        # Check STOCK2 (no action)
-        stock2_plan = next(p for p in result if p['symbol'] == 'STOCK2')
-        self.assertEqual(stock2_plan['action'], 'NO_ACTION')
-        self.assertIn('LTP (1500) not a new high (1600)', stock2_plan['reason'])
+        self.assertEqual([plan.symbol for plan in result], [holding.tradingsymbol for holding in portfolio])
+        update_plans, no_action_plans = main.partition_plans(result)
+        self.assertEqual(len(update_plans), 250)
+        self.assertEqual(len(no_action_plans), 250)
+        for plan, holding in zip(result[::2], portfolio[::2]):
+            self.assertEqual(plan.tier1.qty + plan.tier2.qty, holding.quantity)
     
     def test_cancel_existing_gtts(self):
         """Test cancel_existing_gtts function with mock kite client and GTT data"""
-        # Create mock kite client
-        mock_client = Mock()
+        # Create stub kite client
+        mock_client = StubKiteClient()
         
-        # Create sample active GTTs list with multiple symbols
-        active_gtts_list = [
-            {
-                'trigger_id': 'gtt_001',
-                'tradingsymbol': 'RELIANCE',
-                'status': 'active',
-                'trigger_type': 'single',
-                'trigger_values': [2500.0],
-                'last_price': 2600.0
-            },
-            {
-                'trigger_id': 'gtt_002',
-                'tradingsymbol': 'RELIANCE',
-                'status': 'active',
-                'trigger_type': 'single',
-                'trigger_values': [2400.0],
-                'last_price': 2600.0
-            },
-            {
-                'trigger_id': 'gtt_003',
-                'tradingsymbol': 'TCS',
-                'status': 'active',
-                'trigger_type': 'single',
-                'trigger_values': [3500.0],
-                'last_price': 3600.0
-            },
-            {
-                'trigger_id': 'gtt_004',
-                'tradingsymbol': 'RELIANCE',
-                'status': 'cancelled',  # Should be ignored (not active)
-                'trigger_type': 'single',
-                'trigger_values': [2300.0],
-                'last_price': 2600.0
-            },
-            {
-                'trigger_id': 'gtt_005',
-                'tradingsymbol': 'INFY',
-                'status': 'active',
-                'trigger_type': 'single',
-                'trigger_values': [1400.0],
-                'last_price': 1450.0
-            }
-        ]
+        gtt_index = main.index_active_gtts(self.ACTIVE_GTTS)
         
         # Test canceling GTTs for RELIANCE (should find 2 active GTTs)
-        result = main.cancel_existing_gtts(mock_client, 'RELIANCE', active_gtts_list)
+        result = main.cancel_existing_gtts(mock_client, 'RELIANCE', gtt_index)
         
         # Assertions
         self.assertEqual(result, 2)  # Should cancel 2 GTTs for RELIANCE
         
         # Verify delete_gtt was called exactly 2 times with correct trigger_ids
-        self.assertEqual(mock_client.delete_gtt.call_count, 2)
+        self.assertEqual(len(mock_client.delete_calls), 2)
         
         # Check that the correct trigger_ids were called
-        call_args_list = mock_client.delete_gtt.call_args_list
-        called_trigger_ids = [call[1]['trigger_id'] for call in call_args_list]
+        called_trigger_ids = mock_client.delete_calls
         expected_trigger_ids = ['gtt_001', 'gtt_002']
         
-        self.assertCountEqual(called_trigger_ids, expected_trigger_ids)
+        self.assertEqual(sorted(called_trigger_ids), expected_trigger_ids)
         
-        # Reset mock for next test
-        mock_client.reset_mock()
+        # Reset recorded calls for next test
+        mock_client.delete_calls.clear()
         
         # Test canceling GTTs for TCS (should find 1 active GTT)
-        result = main.cancel_existing_gtts(mock_client, 'TCS', active_gtts_list)
+        result = main.cancel_existing_gtts(mock_client, 'TCS', gtt_index)
         
         self.assertEqual(result, 1)  # Should cancel 1 GTT for TCS
-        self.assertEqual(mock_client.delete_gtt.call_count, 1)
-        mock_client.delete_gtt.assert_called_with(trigger_id='gtt_003')
+        self.assertEqual(mock_client.delete_calls, ['gtt_003'])
         
-        # Reset mock for next test
-        mock_client.reset_mock()
+        # Reset recorded calls for next test
+        mock_client.delete_calls.clear()
         
         # Test canceling GTTs for a symbol with no active GTTs
-        result = main.cancel_existing_gtts(mock_client, 'HDFC', active_gtts_list)
+        result = main.cancel_existing_gtts(mock_client, 'HDFC', gtt_index)
         
         self.assertEqual(result, 0)  # Should cancel 0 GTTs for HDFC
-        self.assertEqual(mock_client.delete_gtt.call_count, 0)
-        mock_client.delete_gtt.assert_not_called()
+        self.assertEqual(mock_client.delete_calls, [])
+    
+    def test_index_active_gtts(self):
+        """Test index_active_gtts groups active GTTs by trading symbol"""
+        gtts = [
+            {'trigger_id': 'gtt_001', 'tradingsymbol': 'RELIANCE', 'status': 'active'},
+            {'trigger_id': 'gtt_002', 'tradingsymbol': 'TCS', 'status': 'active'},
+            {'trigger_id': 'gtt_003', 'tradingsymbol': 'RELIANCE', 'status': 'triggered'},
+            {'trigger_id': 'gtt_004', 'tradingsymbol': 'RELIANCE', 'status': 'active'}
+        ]
+        
+        result = main.index_active_gtts(gtts)
+        
+        self.assertEqual(set(result), {'RELIANCE', 'TCS'})
+        self.assertEqual([gtt['trigger_id'] for gtt in result['RELIANCE']], ['gtt_001', 'gtt_004'])
+        self.assertEqual([gtt['trigger_id'] for gtt in result['TCS']], ['gtt_002'])
     
     def test_cancel_existing_gtts_with_errors(self):
         """Test cancel_existing_gtts function when delete_gtt raises exceptions"""
-        # Create mock kite client that raises exception on delete_gtt
-        mock_client = Mock()
-        mock_client.delete_gtt.side_effect = Exception("API Error")
-        
-        # Create sample active GTTs list
-        active_gtts_list = [
-            {
-                'trigger_id': 'gtt_001',
-                'tradingsymbol': 'RELIANCE',
-                'status': 'active',
-                'trigger_type': 'single',
-                'trigger_values': [2500.0],
-                'last_price': 2600.0
-            }
-        ]
+        # Create stub kite client that raises exception on delete_gtt
+        mock_client = StubKiteClient(error=Exception("API Error"))
         
-        # Test that function handles exceptions gracefully
-        result = main.cancel_existing_gtts(mock_client, 'RELIANCE', active_gtts_list)
+        # Test that function handles exceptions gracefully (TCS has a single active GTT)
+        result = main.cancel_existing_gtts(mock_client, 'TCS', main.index_active_gtts(self.ACTIVE_GTTS))
         
         # Should return 0 canceled GTTs due to exception
         self.assertEqual(result, 0)
         
         # Verify delete_gtt was called but failed
-        self.assertEqual(mock_client.delete_gtt.call_count, 1)
-        mock_client.delete_gtt.assert_called_with(trigger_id='gtt_001')
+        self.assertEqual(mock_client.delete_calls, ['gtt_003'])
     
     def test_cancel_existing_gtts_missing_trigger_id(self):
         """Test cancel_existing_gtts function with GTTs missing trigger_id"""
-        # Create mock kite client
-        mock_client = Mock()
-        
-        # Create sample active GTTs list with missing trigger_id
-        active_gtts_list = [
-            {
-                'tradingsymbol': 'RELIANCE',
-                'status': 'active',
-                'trigger_type': 'single',
-                'trigger_values': [2500.0],
-                'last_price': 2600.0
-                # Missing trigger_id
-            }
-        ]
+        # Create stub kite client
+        mock_client = StubKiteClient()
         
         # Test that function handles missing trigger_id gracefully
-        result = main.cancel_existing_gtts(mock_client, 'RELIANCE', active_gtts_list)
+        result = main.cancel_existing_gtts(mock_client, 'RELIANCE', main.index_active_gtts(self.ACTIVE_GTTS_WITHOUT_TRIGGER_ID))
         
         # Should return 0 canceled GTTs due to missing trigger_id
         self.assertEqual(result, 0)
         
         # Verify delete_gtt was not called
-        mock_client.delete_gtt.assert_not_called()
+        self.assertEqual(mock_client.delete_calls, [])
     
     def test_place_new_gtts(self):
         """Test place_new_gtts function with mock kite client and UPDATE plan"""
-        # Create mock kite client
-        mock_client = Mock()
+        # Create stub kite client
+        mock_client = StubKiteClient()
         
         # Create sample UPDATE plan with both tiers having quantities > 0
-        update_plan = {
-            'symbol': 'RELIANCE',
-            'action': 'UPDATE',
-            'exchange': 'NSE',
-            'new_high': 2600.0,
-            'tier1': {
-                'qty': 30,
-                'trigger': 2340.0,
-                'limit': 2314.0
-            },
-            'tier2': {
-                'qty': 70,
-                'trigger': 2080.0,
-                'limit': 2054.0
-            }
-        }
+        update_plan = self.UPDATE_PLAN
         
         # Call the function
         result = main.place_new_gtts(mock_client, update_plan)
@@ -479,14 +646,10 @@ class TestGTTStrategy(unittest.TestCase):
         self.assertEqual(result, 2)  # Should place 2 GTTs (both tiers)
         
         # Verify place_gtt was called exactly twice
-        self.assertEqual(mock_client.place_gtt.call_count, 2)
-        
-        # Get all call arguments
-        call_args_list = mock_client.place_gtt.call_args_list
+        self.assertEqual(len(mock_client.place_calls), 2)
         
         # Check Tier 1 GTT call arguments
-        tier1_call = call_args_list[0]
-        tier1_kwargs = tier1_call[1]  # keyword arguments
+        tier1_kwargs = mock_client.place_calls[0]
         
         self.assertEqual(tier1_kwargs['trigger_type'], 'single')
         self.assertEqual(tier1_kwargs['tradingsymbol'], 'RELIANCE')
@@ -503,8 +666,7 @@ class TestGTTStrategy(unittest.TestCase):
         self.assertEqual(tier1_order['product'], 'CNC')
         
         # Check Tier 2 GTT call arguments
-        tier2_call = call_args_list[1]
-        tier2_kwargs = tier2_call[1]  # keyword arguments
+        tier2_kwargs = mock_client.place_calls[1]
         
         self.assertEqual(tier2_kwargs['trigger_type'], 'single')
         self.assertEqual(tier2_kwargs['tradingsymbol'], 'RELIANCE')
@@ -520,236 +682,72 @@ class TestGTTStrategy(unittest.TestCase):
         self.assertEqual(tier2_order['order_type'], 'LIMIT')
         self.assertEqual(tier2_order['product'], 'CNC')
     
-    def test_place_new_gtts_with_zero_quantities(self):
-        """Test place_new_gtts function with zero quantities (small holdings)"""
-        # Create mock kite client
-        mock_client = Mock()
-        
-        # Create sample UPDATE plan with tier1_qty = 0 (small holding scenario)
-        update_plan = {
-            'symbol': 'SMALLSTOCK',
-            'action': 'UPDATE',
-            'exchange': 'NSE',
-            'new_high': 100.0,
-            'tier1': {
-                'qty': 0,  # Zero quantity - should be skipped
-                'trigger': 90.0,
-                'limit': 89.0
-            },
-            'tier2': {
-                'qty': 5,  # Non-zero quantity - should be placed
-                'trigger': 80.0,
-                'limit': 79.0
-            }
-        }
-        
-        # Call the function
-        result = main.place_new_gtts(mock_client, update_plan)
-        
-        # Assertions
-        self.assertEqual(result, 1)  # Should place only 1 GTT (tier2 only)
-        
-        # Verify place_gtt was called exactly once (only for tier2)
-        self.assertEqual(mock_client.place_gtt.call_count, 1)
-        
-        # Check that only Tier 2 GTT was placed
-        call_args = mock_client.place_gtt.call_args
-        kwargs = call_args[1]
-        
-        self.assertEqual(kwargs['trigger_values'], [80.0])
-        self.assertEqual(kwargs['orders'][0]['quantity'], 5)
-        self.assertEqual(kwargs['orders'][0]['price'], 79.0)
-    
-    def test_place_new_gtts_both_zero_quantities(self):
-        """Test place_new_gtts function when both tiers have zero quantities"""
-        # Create mock kite client
-        mock_client = Mock()
-        
-        # Create sample UPDATE plan with both tiers having zero quantities
-        update_plan = {
-            'symbol': 'VERYSMALLSTOCK',
-            'action': 'UPDATE',
-            'exchange': 'NSE',
-            'new_high': 50.0,
-            'tier1': {
-                'qty': 0,  # Zero quantity
-                'trigger': 45.0,
-                'limit': 44.5
-            },
-            'tier2': {
-                'qty': 0,  # Zero quantity
-                'trigger': 40.0,
-                'limit': 39.5
-            }
-        }
-        
-        # Call the function
-        result = main.place_new_gtts(mock_client, update_plan)
-        
-        # Assertions
-        self.assertEqual(result, 0)  # Should place 0 GTTs
-        
-        # Verify place_gtt was not called
-        mock_client.place_gtt.assert_not_called()
-    
-    def test_place_new_gtts_invalid_action(self):
-        """Test place_new_gtts function with invalid action"""
-        # Create mock kite client
-        mock_client = Mock()
-        
-        # Create plan with invalid action
-        invalid_plan = {
-            'symbol': 'TESTSTOCK',
-            'action': 'NO_ACTION',  # Invalid action for this function
-            'exchange': 'NSE',
-            'tier1': {'qty': 10, 'trigger': 100.0, 'limit': 99.0},
-            'tier2': {'qty': 20, 'trigger': 90.0, 'limit': 89.0}
-        }
-        
-        # Call the function
-        result = main.place_new_gtts(mock_client, invalid_plan)
-        
-        # Assertions
-        self.assertEqual(result, 0)  # Should place 0 GTTs
-        
-        # Verify place_gtt was not called
-        mock_client.place_gtt.assert_not_called()
-    
-    def test_place_new_gtts_missing_symbol(self):
-        """Test place_new_gtts function with missing symbol"""
-        # Create mock kite client
-        mock_client = Mock()
-        
-        # Create plan with missing symbol
-        invalid_plan = {
-            'action': 'UPDATE',
-            'exchange': 'NSE',
-            'tier1': {'qty': 10, 'trigger': 100.0, 'limit': 99.0},
-            'tier2': {'qty': 20, 'trigger': 90.0, 'limit': 89.0}
-            # Missing 'symbol' field
-        }
-        
-        # Call the function
-        result = main.place_new_gtts(mock_client, invalid_plan)
-        
-        # Assertions
-        self.assertEqual(result, 0)  # Should place 0 GTTs
-        
-        # Verify place_gtt was not called
-        mock_client.place_gtt.assert_not_called()
-    
-    def test_place_new_gtts_with_api_errors(self):
-        """Test place_new_gtts function when place_gtt raises exceptions"""
-        # Create mock kite client that raises exception on place_gtt
-        mock_client = Mock()
-        mock_client.place_gtt.side_effect = Exception("API Error")
-        
-        # Create sample UPDATE plan
-        update_plan = {
-            'symbol': 'ERRORSTOCK',
-            'action': 'UPDATE',
-            'exchange': 'NSE',
-            'new_high': 1000.0,
-            'tier1': {
-                'qty': 10,
-                'trigger': 900.0,
-                'limit': 890.0
-            },
-            'tier2': {
-                'qty': 20,
-                'trigger': 800.0,
-                'limit': 790.0
-            }
-        }
-        
-        # Call the function
-        result = main.place_new_gtts(mock_client, update_plan)
-        
-        # Should return 0 placed GTTs due to exceptions
-        self.assertEqual(result, 0)
-        
-        # Verify place_gtt was called twice but both failed
-        self.assertEqual(mock_client.place_gtt.call_count, 2)
-    
-    def test_place_new_gtts_with_different_exchange(self):
-        """Test place_new_gtts function with BSE exchange"""
-        # Create mock kite client
-        mock_client = Mock()
-        
-        # Create sample UPDATE plan with BSE exchange
-        update_plan = {
-            'symbol': 'RELIANCE',
-            'action': 'UPDATE',
-            'exchange': 'BSE',  # Different exchange
-            'new_high': 2600.0,
-            'tier1': {
-                'qty': 30,
-                'trigger': 2340.0,
-                'limit': 2314.0
-            },
-            'tier2': {
-                'qty': 70,
-                'trigger': 2080.0,
-                'limit': 2054.0
-            }
-        }
-        
-        # Call the function
-        result = main.place_new_gtts(mock_client, update_plan)
-        
-        # Assertions
-        self.assertEqual(result, 2)  # Should place 2 GTTs (both tiers)
-        
-        # Verify place_gtt was called exactly twice
-        self.assertEqual(mock_client.place_gtt.call_count, 2)
-        
-        # Get all call arguments
-        call_args_list = mock_client.place_gtt.call_args_list
-        
-        # Check that both calls used BSE exchange
-        for call in call_args_list:
-            kwargs = call[1]
-            self.assertEqual(kwargs['exchange'], 'BSE')
-    
-    def test_place_new_gtts_missing_exchange_defaults_to_nse(self):
-        """Test place_new_gtts function defaults to NSE when exchange is missing"""
-        # Create mock kite client
-        mock_client = Mock()
-        
-        # Create sample UPDATE plan without exchange field
-        update_plan = {
-            'symbol': 'RELIANCE',
-            'action': 'UPDATE',
+    def test_place_new_gtts_cases(self):
+        """Test which GTTs place_new_gtts places across quantities, invalid plans, exchanges and API errors"""
+        api_error = Exception("API Error")
+        no_exchange_plan = main.Plan(
+            symbol='RELIANCE',
+            action='UPDATE',
             # Missing 'exchange' field - should default to NSE
-            'new_high': 2600.0,
-            'tier1': {
-                'qty': 30,
-                'trigger': 2340.0,
-                'limit': 2314.0
-            },
-            'tier2': {
-                'qty': 70,
-                'trigger': 2080.0,
-                'limit': 2054.0
-            }
-        }
+            new_high=2600.0,
+            tier1=self.UPDATE_PLAN.tier1,
+            tier2=self.UPDATE_PLAN.tier2
+        )
         
-        # Call the function
-        result = main.place_new_gtts(mock_client, update_plan)
-        
-        # Assertions
-        self.assertEqual(result, 2)  # Should place 2 GTTs (both tiers)
+        # (case, plan, place_gtt error, expected result, expected (quantity, trigger, limit) per call, expected exchange)
+        test_cases = [
+            ('tier 1 zero quantity',
+             replace(self.UPDATE_PLAN, tier1=main.Tier(qty=0, trigger=90.0, limit=89.0),
+                     tier2=main.Tier(qty=5, trigger=80.0, limit=79.0)),
+             None, 1, [(5, 80.0, 79.0)], 'NSE'),
+            ('both tiers zero quantity',
+             replace(self.UPDATE_PLAN, tier1=main.Tier(qty=0, trigger=45.0, limit=44.5),
+                     tier2=main.Tier(qty=0, trigger=40.0, limit=39.5)),
+             None, 0, [], None),
+            ('invalid action', replace(self.UPDATE_PLAN, action='NO_ACTION'), None, 0, [], None),
+            ('missing symbol', replace(self.UPDATE_PLAN, symbol=''), None, 0, [], None),
+            ('API errors', self.UPDATE_PLAN, api_error, 0, [(30, 2340.0, 2314.0), (70, 2080.0, 2054.0)], 'NSE'),
+            ('BSE exchange', replace(self.UPDATE_PLAN, exchange='BSE'), None, 2, [(30, 2340.0, 2314.0), (70, 2080.0, 2054.0)], 'BSE'),
+            ('missing exchange', no_exchange_plan, None, 2, [(30, 2340.0, 2314.0), (70, 2080.0, 2054.0)], 'NSE'),
+        ]
         
-        # Verify place_gtt was called exactly twice
-        self.assertEqual(mock_client.place_gtt.call_count, 2)
+        for case, plan, error, expected_result, expected_calls, expected_exchange in test_cases:
+            with self.subTest(case=case):
+                mock_client = StubKiteClient(error=error)
+                
+                result = main.place_new_gtts(mock_client, plan)
+                
+                self.assertEqual(result, expected_result)
+                self.assertEqual(
+                    [
+                        (kwargs['orders'][0]['quantity'], kwargs['trigger_values'][0], kwargs['orders'][0]['price'])
+                        for kwargs in mock_client.place_calls
+                    ],
+                    expected_calls
+                )
+                for kwargs in mock_client.place_calls:
+                    self.assertEqual(kwargs['exchange'], expected_exchange)
+    
+    def test_rate_limiter_waits_when_bucket_is_empty(self):
+        """Test RateLimiter never lets more than rate requests into any one-second window"""
+        clock = [0.0]
         
-        # Get all call arguments
-        call_args_list = mock_client.place_gtt.call_args_list
+        def fake_sleep(seconds):
+            clock[0] += seconds
         
-        # Check that both calls defaulted to NSE exchange
-        for call in call_args_list:
-            kwargs = call[1]
-            self.assertEqual(kwargs['exchange'], 'NSE')
+        with patch('main.time.monotonic', side_effect=lambda: clock[0]), \
+             patch('main.time.sleep', side_effect=fake_sleep):
+            limiter = main.RateLimiter(10)
+            
+            acquired_at = []
+            for _ in range(30):
+                limiter.acquire()
+                acquired_at.append(clock[0])
+        
+        # Any 11 consecutive requests must span at least a full second
+        for first, eleventh in zip(acquired_at, acquired_at[10:]):
+            self.assertGreaterEqual(eleventh - first, 1 - 1e-9)
+        self.assertEqual(acquired_at[0], 0.0)
     
     def test_round_to_tick(self):
         """Test round_to_tick function with various price values"""
@@ -762,28 +760,97 @@ class TestGTTStrategy(unittest.TestCase):
             (10.13, 10.10),  # Round down from 10.13 to 10.10
             (10.16, 10.15),  # Round down from 10.16 to 10.15
             (10.19, 10.15),  # Round down from 10.19 to 10.15
-            (10.20, 10.15),  # Round down from 10.20 to 10.15 (floating point precision)
+            (10.20, 10.20),  # Already on tick, should remain same
             (100.00, 100.00), # Whole number, should remain same
             (100.01, 100.00), # Round down from 100.01 to 100.00
             (100.04, 100.00), # Round down from 100.04 to 100.00
-            (100.05, 100.00), # Round down from 100.05 to 100.00 (floating point precision)
+            (100.05, 100.05), # Already on tick, should remain same
             (100.07, 100.05), # Round down from 100.07 to 100.05
         ]
         
+        round_to_tick = main.round_to_tick
         for input_price, expected_output in test_cases:
             with self.subTest(input_price=input_price):
-                result = main.round_to_tick(input_price)
-                self.assertAlmostEqual(result, expected_output, places=2,
-                                     msg=f"round_to_tick({input_price}) should be {expected_output}, got {result}")
+                result = round_to_tick(input_price)
+                self.assertEqual(result, expected_output,
+                                 msg=f"round_to_tick({input_price}) should be {expected_output}, got {result}")
         
         # Test with custom tick size
-        self.assertAlmostEqual(main.round_to_tick(10.18, 0.10), 10.10, places=2)
-        self.assertAlmostEqual(main.round_to_tick(10.25, 0.10), 10.20, places=2)
-        self.assertAlmostEqual(main.round_to_tick(10.30, 0.10), 10.30, places=2)
+        self.assertEqual(round_to_tick(10.18, 0.10), 10.10)
+        self.assertEqual(round_to_tick(10.25, 0.10), 10.20)
+        self.assertEqual(round_to_tick(10.30, 0.10), 10.30)
         
         # Test with tick size of 0.01 (1 paisa)
-        self.assertAlmostEqual(main.round_to_tick(10.186, 0.01), 10.18, places=2)
-        self.assertAlmostEqual(main.round_to_tick(10.189, 0.01), 10.18, places=2)
+        self.assertEqual(round_to_tick(10.186, 0.01), 10.18)
+        self.assertEqual(round_to_tick(10.189, 0.01), 10.18)
+        
+        # Test with tick sizes that are not a whole number of paise
+        self.assertEqual(round_to_tick(10.1234, 0.0025), 10.1225)
+        self.assertEqual(round_to_tick(10.1234, 0.001), 10.123)
+        self.assertEqual(round_to_tick(10.17, 0.025), 10.15)
+        self.assertEqual(round_to_tick(10.175, 0.025), 10.175)
+        
+        # Test that a non-positive tick size is rejected
+        with self.assertRaises(ValueError):
+            round_to_tick(10.18, 0)
+    
+    def test_partition_plans(self):
+        """Test partition_plans splits plans by action while keeping their order"""
+        plans = [
+            main.Plan(symbol='STOCK1', action='UPDATE'),
+            main.Plan(symbol='STOCK2', action='NO_ACTION'),
+            main.Plan(symbol='STOCK3', action='UPDATE')
+        ]
+        
+        update_plans, no_action_plans = main.partition_plans(plans)
+        
+        self.assertEqual([plan.symbol for plan in update_plans], ['STOCK1', 'STOCK3'])
+        self.assertEqual([plan.symbol for plan in no_action_plans], ['STOCK2'])
+    
+    def test_format_gtt_report(self):
+        """Test format_gtt_report output for mixed UPDATE and NO_ACTION plans"""
+        plans = [
+            main.Plan(
+                symbol='TCS',
+                action='UPDATE',
+                exchange='NSE',
+                new_high=3700.0,
+                tier1=main.Tier(qty=15, trigger=3330.0, limit=3293.0),
+                tier2=main.Tier(qty=35, trigger=2960.0, limit=2923.0)
+            ),
+            main.Plan(
+                symbol='INFY',
+                action='NO_ACTION',
+                exchange='NSE',
+                current_price=1450.0,
+                last_high_price=1500.0
+            )
+        ]
+        
+        expected = "\n".join([
+            "=" * 80,
+            "GTT STOP-LOSS STRATEGY - DRY RUN REPORT",
+            "=" * 80,
+            "",
+            "SUMMARY: 2 holdings analyzed | 1 updates planned | 1 no action",
+            "",
+            "🔄 ACTIONS REQUIRED:",
+            "-" * 40,
+            "TCS: ACTION_UPDATE | New High: ₹3700.0",
+            "  └─ Tier 1: 15 shares @ Trigger: ₹3330.0, Limit: ₹3293.0",
+            "  └─ Tier 2: 35 shares @ Trigger: ₹2960.0, Limit: ₹2923.0",
+            "",
+            "✅ NO ACTION REQUIRED:",
+            "-" * 40,
+            "INFY: NO_ACTION | LTP (1450.0) not a new high (1500.0)",
+            "",
+            "=" * 80,
+            "End of Report",
+            "=" * 80
+        ])
+        
+        self.assertEqual(main.format_gtt_report(plans), expected)
+        self.assertEqual(main.format_gtt_report([]), "No GTT plans generated.")
     
     @patch('main.get_kite_client')
     @patch('main.load_gtt_state')
@@ -808,28 +875,10 @@ class TestGTTStrategy(unittest.TestCase):
         mock_save_state.return_value = True
         
         # Setup plan_gtt_updates to return two UPDATE plans
-        mock_plans = [
-            {
-                'symbol': 'STOCK1',
-                'action': 'UPDATE',
-                'exchange': 'NSE',
-                'new_high': 1000.0,
-                'tier1': {'qty': 30, 'trigger': 900.0, 'limit': 890.0},
-                'tier2': {'qty': 70, 'trigger': 800.0, 'limit': 790.0}
-            },
-            {
-                'symbol': 'STOCK2', 
-                'action': 'UPDATE',
-                'exchange': 'NSE',
-                'new_high': 2000.0,
-                'tier1': {'qty': 15, 'trigger': 1800.0, 'limit': 1780.0},
-                'tier2': {'qty': 35, 'trigger': 1600.0, 'limit': 1580.0}
-            }
-        ]
-        mock_plan_updates.return_value = mock_plans
+        mock_plan_updates.return_value = list(self.LIVE_RUN_PLANS)
         
         # Setup cancel_existing_gtts to raise exception for first stock only
-        def cancel_side_effect(client, symbol, active_gtts):
+        def cancel_side_effect(client, symbol, gtt_index):
             if symbol == 'STOCK1':
                 raise Exception("API Error for STOCK1")
             return 2  # Success for STOCK2
@@ -847,21 +896,43 @@ class TestGTTStrategy(unittest.TestCase):
         
         # Verify that cancel_existing_gtts was called for both stocks
         self.assertEqual(mock_cancel_gtts.call_count, 2)
-        mock_cancel_gtts.assert_any_call(mock_client, 'STOCK1', [])
-        mock_cancel_gtts.assert_any_call(mock_client, 'STOCK2', [])
+        mock_cancel_gtts.assert_any_call(mock_client, 'STOCK1', {})
+        mock_cancel_gtts.assert_any_call(mock_client, 'STOCK2', {})
         
         # Verify that place_new_gtts was only called for STOCK2 (STOCK1 failed at cancel step)
         self.assertEqual(mock_place_gtts.call_count, 1)
-        mock_place_gtts.assert_called_with(mock_client, mock_plans[1])  # Only STOCK2 plan
+        mock_place_gtts.assert_called_with(mock_client, self.LIVE_RUN_PLANS[1])  # Only STOCK2 plan
         
         # Verify that save_gtt_state was called
         mock_save_state.assert_called_once()
         
         # Verify the saved state only contains STOCK2 (STOCK1 failed)
-        saved_state_call = mock_save_state.call_args[0][1]  # Second argument is the state data
+        saved_state_call = mock_save_state.call_args.args[1]  # Second argument is the state data
         self.assertIn('STOCK2', saved_state_call)
         self.assertNotIn('STOCK1', saved_state_call)  # STOCK1 should not be in saved state due to failure
         self.assertEqual(saved_state_call['STOCK2']['last_high_price'], 2000.0)
 
+    @patch('main.get_kite_client')
+    @patch('main.load_gtt_state')
+    @patch('main.get_portfolio_with_ltp')
+    @patch('main.plan_gtt_updates')
+    @patch('main.save_gtt_state')
+    def test_main_live_run_skips_save_without_updates(self, mock_save_state, mock_plan_updates,
+                                                     mock_get_portfolio, mock_load_state, mock_get_kite):
+        """Test main_live_run leaves the state file alone when no plan was executed"""
+        mock_client = Mock()
+        mock_client.get_gtts.return_value = []
+        mock_get_kite.return_value = mock_client
+        mock_load_state.return_value = {'TCS': {'last_high_price': 3500.0}}
+        mock_get_portfolio.return_value = []
+        mock_plan_updates.return_value = [
+            main.Plan(symbol='TCS', action='NO_ACTION', current_price=3000.0, last_high_price=3500.0)
+        ]
+
+        main.main_live_run()
+
+        mock_save_state.assert_not_called()
+        mock_client.place_gtt.assert_not_called()
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file